@@ -1,88 +1,66 @@
-import csv
-from statistics import median
+import os
+import sys
 
-from tools.language_level import get_language_level
+from tools import frequency_lists, inflections
+from tools.build import BuildStage
+from tools.build_metrics import BuildMetrics
 
 """
 This script process the U of Haute Savoie frequency list, and output 12 lists of words
 grouped by language level to be able to later tag the corresponding entries in jiji dictionaries
+It also outputs the table of the inflected forms of the lemmas(conjugated verbs, plurals...), see tools/inflections.py
+It can be run on its own or as part of the whole build, see tools/build.py:
+    python process_lexique.py [directory of the frequency list, the directory of this script by default]
 """
 
-TSV_FILE_PATH = './Lexique382.tsv'
-TAGS_DIRECTORY_PATH = '../tags'
+BUILDER_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+# Paths relative to the directory of the frequency list
+TSV_FILE = 'Lexique382.tsv'
+TAGS_DIRECTORY = '../tags'
 STOPWORDS_TAG_FILE = 'stopword.txt'
-
-RANK_LAST = 1000000
-
-
-# Read Japanese stopwords into a python dictionary
-stopwords = {}
-with open(f"{TAGS_DIRECTORY_PATH}/{STOPWORDS_TAG_FILE}") as f:
-    for l in f.readlines():
-        stopwords[l.strip()] = True
-
-
-def offset_stopword(rank, nb_lemmas_in_stopwords):
-    """Offset word frequency rankings by a small amount to take into account the missing ranks from ignored stopwords"""
-    return max(1, rank - nb_lemmas_in_stopwords)
-
-
-def read_lexique():
-    """Read word frequency TSV file"""
-    lists = dict()
-    lemmas_freq = []
-    nb_lemmas_in_stopwords = 0
-    with open(TSV_FILE_PATH, newline='', encoding='utf-8') as freq_file:
-        tsv_in = csv.reader(freq_file, delimiter='\t')
-        next(tsv_in)  # Skip headers row
-        for row in tsv_in:
-            # row => 1_ortho	2_phon	3_lemme	4_cgram	5_genre	6_nombre	7_freqlemfilms2	8_freqlemlivres	9_freqfilms2	10_freqlivres...
-            lemma = row[2]
-
-            freqlemfilms2 = row[6].strip()
-            freqlemlivres = row[7].strip()
-
-            islem = bool(int(row[13]))
-
-            if not islem:
-                # skip entries that are not lemma(conjugated forms, etc...)
-                continue
-
-            # Ignore lemmas in the stopword list(very very frequent lemmas used for grammar)
-            if lemma in stopwords:
-                nb_lemmas_in_stopwords += 1
-                continue
-
-            if not freqlemfilms2 and not freqlemlivres:
-                continue
-            elif not freqlemfilms2:
-                overall_freq = float(freqlemlivres)
-            elif not freqlemlivres:
-                overall_freq = float(freqlemfilms2)
-            else:
-                overall_freq = (2 * float(freqlemfilms2) + float(freqlemlivres)) / 3
-
-            lemmas_freq.append((lemma, overall_freq))
-
-    rank = 0
-    lemmas_freq.sort(key=lambda lf: -lf[1])
-    for lemma, freq in lemmas_freq:
-        rank += 1
-        lang_level = get_language_level(rank)
-        if lang_level not in lists:
-            lists[lang_level] = []
-        lists[lang_level].append(lemma)
-
-    return lists
-
-
-lemmas_by_lang_level = read_lexique()
-
-
-# Write frequency lists in tags/ folder
-for lang_level, lemmas in lemmas_by_lang_level.items():
-    if lang_level == 13:
-        # Language level 13 contains very infrequent words that should be ignored
-        continue
-    with open(f"{TAGS_DIRECTORY_PATH}/freq{lang_level:02}.txt", 'w') as out:
-        out.write('\n'.join(sorted(set(lemmas))))
+INFLECTIONS_FILE = '../lexique.inflections.tsv.gz'
+
+# row => 1_ortho	2_phon	3_lemme	4_cgram	5_genre	6_nombre	7_freqlemfilms2	8_freqlemlivres	9_freqfilms2	10_freqlivres...
+LEXIQUE_COLUMNS = {
+    'lemma': 2,
+    # skip entries that are not lemma(conjugated forms, etc...), 14_islem
+    'filter_column': 13,
+    # Lemmas are ranked by their frequency, films subtitles count twice as much as books
+    'frequencies': [(6, 2), (7, 1)],
+}
+# Every row is a form(1_ortho) of a lemma(3_lemme), including the rows skipped for the frequency lists
+LEXIQUE_INFLECTION_COLUMNS = [0, 2]
+
+
+def build_frequency_tags(metrics, directory=BUILDER_DIRECTORY):
+    with metrics.stage('frequency'):
+        frequency_lists.build_frequency_tags(os.path.join(directory, TSV_FILE), os.path.join(directory, TAGS_DIRECTORY),
+                                             LEXIQUE_COLUMNS, STOPWORDS_TAG_FILE)
+
+
+def build_inflections(metrics, directory=BUILDER_DIRECTORY):
+    inflections_path = os.path.normpath(os.path.join(directory, INFLECTIONS_FILE))
+    with metrics.stage('inflect'):
+        forms, lemmas = frequency_lists.read_columns(os.path.join(directory, TSV_FILE), LEXIQUE_INFLECTION_COLUMNS)
+        nb_forms = inflections.write_inflection_table(inflections_path, zip(forms, lemmas))
+    metrics.count('inflected_forms', nb_forms)
+    print(f'{nb_forms} inflected forms written to {inflections_path}')
+
+
+def get_stages(directory=BUILDER_DIRECTORY):
+    tsv_file = os.path.join(directory, TSV_FILE)
+    tags_directory = os.path.join(directory, TAGS_DIRECTORY)
+    return [
+        BuildStage('frequency', build_frequency_tags,
+                   inputs=[tsv_file, os.path.join(tags_directory, STOPWORDS_TAG_FILE), frequency_lists.__file__],
+                   optional_outputs=[os.path.join(tags_directory, f) for f in frequency_lists.FREQUENCY_TAG_FILES]),
+        BuildStage('inflect', build_inflections,
+                   inputs=[tsv_file, inflections.__file__], outputs=[os.path.join(directory, INFLECTIONS_FILE)]),
+    ]
+
+
+if __name__ == '__main__':
+    metrics = BuildMetrics('lexique')
+    builder_directory = sys.argv[1] if len(sys.argv) > 1 else BUILDER_DIRECTORY
+    build_frequency_tags(metrics, builder_directory)
+    build_inflections(metrics, builder_directory)
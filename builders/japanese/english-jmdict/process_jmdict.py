@@ -1,7 +1,14 @@
+import os
+import gzip
 import xml.etree.ElementTree as etree
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import jiji
-from tools import download
+from tools import download, inflections
+from tools.build import BuildStage
+from tools.build_cache import BuildCache
+from tools.build_metrics import BuildMetrics
 
 """
 This script process the JMDict XML file and output jiji dictionary
@@ -40,6 +47,7 @@ Here is a sample entry for JMdict XML format
 </entry>
 
 In particular we want to keep the word kanji forms(<keb> tag), kana forms(<reb> tag), and meaning(<sense> tag)
+It can be run on its own or as part of the whole build, see tools/build.py
 """
 
 
@@ -64,29 +72,109 @@ TAGS_FILES_OPTS = (
     'freq12.txt'
 )
 WRITTEN_WITH_KANA_PROP = 'word usually written using kana alone'
-
-
-jmdict = download.download_if_modified('ftp://ftp.monash.edu.au/pub/nihongo/JMdict_e.gz')
-#jmdict = '/home/julian/Prog/github.com/jiji/builders/japanese/english-jmdict/work/JMdict_e'
-
-jiji_dict = jiji.Dictionary(
-    title="Jim's Breen Japanese dictionary",
-    lang_from='Japanese',
-    lang_to='English',
-    licence='Creative Commons Attribution-ShareAlike Licence (V3.0)'
-)
-
-
-def read_dictionary():
-    with open(jmdict, 'r') as xml_file:
-        tree = etree.parse(xml_file)
-        root = tree.getroot()
-        for entry in root:
-            process_jmdict_entry(entry)
+JMDICT_URL = 'ftp://ftp.monash.edu.au/pub/nihongo/JMdict_e.gz'
+BUILDER_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+TAGS_DIRECTORY_PATH = os.path.normpath(os.path.join(BUILDER_DIRECTORY, '../tags'))
+DICTIONARIES_DIRECTORY = os.path.normpath(os.path.join(BUILDER_DIRECTORY, '../../../dictionaries/japanese'))
+OUTPUT_PATH = os.path.join(DICTIONARIES_DIRECTORY, 'jmdict_english.jiji.yaml')
+INFLECTIONS_PATH = os.path.join(DICTIONARIES_DIRECTORY, 'jmdict_english.jiji.inflections.tsv.gz')
+# Names of the build caches of the dictionary and of the inflections, see tools/build_cache.py
+BUILD_NAME = 'jmdict_english'
+INFLECTIONS_BUILD_NAME = 'jmdict_english_inflections'
+
+# Conjugation class of the JMdict parts of speech(<pos> once the DTD entities are expanded), see tools/inflections.py
+# Older JMdict versions quote the endings with `ku' instead of 'ku'
+CONJUGATION_CLASSES = {
+    'Ichidan verb': 'v1',
+    'Ichidan verb - kureru special class': 'v1',
+    "Godan verb with 'u' ending": 'v5u',
+    "Godan verb with 'ku' ending": 'v5k',
+    "Godan verb with 'gu' ending": 'v5g',
+    "Godan verb with 'su' ending": 'v5s',
+    "Godan verb with 'tsu' ending": 'v5t',
+    "Godan verb with 'nu' ending": 'v5n',
+    "Godan verb with 'bu' ending": 'v5b',
+    "Godan verb with 'mu' ending": 'v5m',
+    "Godan verb with 'ru' ending": 'v5r',
+    "Godan verb with 'ru' ending (irregular verb)": 'v5r-i',
+    'Godan verb - Iku/Yuku special class': 'v5k-s',
+    'Godan verb - -aru special class': 'v5aru',
+    'Kuru verb - special class': 'vk',
+    'suru verb - included': 'vs-i',
+    'noun or participle which takes the aux. verb suru': 'vs',
+    'adjective (keiyoushi)': 'adj-i',
+    'adjective (keiyoushi) - yoi/ii class': 'adj-ix',
+}
+
+
+# Number of processes converting the JMdict entries, 1 to process them in the main process
+NB_PROCESSES = os.cpu_count()
+# Size of the parts of the XML file sent to each process
+CHUNK_SIZE = 1024 * 1024
+
+
+def read_dictionary(jmdict, nb_processes=1):
+    """Read the gzipped JMdict XML file and yield its entries converted to jiji entries, in the file order"""
+    if nb_processes <= 1:
+        for xml_entry in iter_xml_entries(jmdict):
+            yield process_jmdict_entry(xml_entry)
+        return
+
+    # The XML chunks are converted in parallel, only a few chunks ahead of the
+    # one being read are queued so that memory usage stays flat
+    with ProcessPoolExecutor(nb_processes) as executor:
+        pending = deque()
+        for xml_header, xml_chunk in iter_xml_chunks(jmdict):
+            pending.append(executor.submit(process_jmdict_chunk, xml_header, xml_chunk))
+            if len(pending) > 2 * nb_processes:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def iter_xml_entries(jmdict):
+    """Stream the gzipped JMdict XML file, each <entry> is yielded as soon as it is parsed
+    and then dropped from the tree so memory usage does not grow with the size of the input"""
+    with gzip.open(jmdict, 'rb') as xml_file:
+        xml_events = etree.iterparse(xml_file, events=('start', 'end'))
+        _, root = next(xml_events)
+        for event, node in xml_events:
+            if event == 'end' and node.tag == 'entry':
+                yield node
+                root.clear()
+
+
+def iter_xml_chunks(jmdict):
+    """Split the gzipped JMdict XML file in chunks of whole <entry> elements without parsing it
+    Each chunk is yielded with the XML header(declaration and DTD with the entities definitions)
+    so that it can be parsed on its own"""
+    with gzip.open(jmdict, 'rb') as xml_file:
+        data = xml_file.read(CHUNK_SIZE)
+        doctype_end = data.find(b']>', data.find(b'<!DOCTYPE')) if b'<!DOCTYPE' in data else 0
+        header_end = data.find(b'<entry>', doctype_end)
+        if header_end < 0:
+            raise RuntimeError(f"no <entry> found at the beginning of {jmdict}")
+        xml_header, data = data[:header_end], data[header_end:]
+        while True:
+            block = xml_file.read(CHUNK_SIZE)
+            data += block
+            chunk_end = data.rfind(b'</entry>')
+            if chunk_end >= 0:
+                chunk_end += len(b'</entry>')
+                yield xml_header, data[:chunk_end]
+                data = data[chunk_end:]
+            if not block:
+                break
+
+
+def process_jmdict_chunk(xml_header, xml_chunk):
+    """Convert a chunk of JMdict <entry> elements to jiji entries, see iter_xml_chunks"""
+    root = etree.fromstring(xml_header + xml_chunk + b'</JMdict>')
+    return [process_jmdict_entry(xml_entry) for xml_entry in root.iter('entry')]
 
 
 def process_jmdict_entry(xml_entry):
-    """Process one entry of the english-jmdict xml file"""
+    """Convert one entry of the english-jmdict xml file to a jiji entry"""
     entry_number = xml_entry.find('ent_seq').text
     entry = jiji.Entry(entry_number)
     lemmas = []
@@ -122,16 +210,34 @@ def process_jmdict_entry(xml_entry):
         if r.text not in lemmas:
             entry.add_pronunciation(r.text)
 
+    # Restrictions are sets, write them in the order of the lemmas/readings so that
+    # the output does not depend on the hash seed of the process converting the entry
+    forms = entry.lemmas + entry.pronunciations
     for s in senses:
-        entry.add_sense(s.glosses, s.lemmas_restriction | s.readings_restriction)
+        restriction = s.lemmas_restriction | s.readings_restriction
+        entry.add_sense(s.glosses, sorted(restriction, key=lambda t: forms.index(t) if t in forms else len(forms)))
 
-    # Add nfxx tags concerning word frequency
-    tags = {n.text for n in xml_entry.findall('./k_ele/ke_pri') + xml_entry.findall('./r_ele/re_pri')}
+    # Add nfxx tags concerning word frequency, in the order they appear
+    tags = dict.fromkeys(n.text for n in xml_entry.findall('./k_ele/ke_pri') + xml_entry.findall('./r_ele/re_pri'))
     for t in tags:
         if t.startswith('nf'):
             entry.add_tag(t)
 
-    jiji_dict.add_entry(entry)
+    return entry
+
+
+def iter_inflected_forms(jmdict):
+    """Yield the (conjugated form, dictionary form) of the kanji and kana forms of the JMdict verbs and adjectives"""
+    for xml_entry in iter_xml_entries(jmdict):
+        pos = {(p.text or '').replace('`', "'") for p in xml_entry.iter('pos')}
+        conjugation_classes = [CONJUGATION_CLASSES[p] for p in sorted(pos) if p in CONJUGATION_CLASSES]
+        if not conjugation_classes:
+            continue
+        words = [n.text for n in xml_entry.iter('keb')] + [n.text for n in xml_entry.iter('reb')]
+        for conjugation_class in conjugation_classes:
+            for word in words:
+                for form in inflections.conjugate(word, conjugation_class):
+                    yield form, word
 
 
 class JmdictReading:
@@ -174,14 +280,93 @@ class JmdictSense:
         return self.lemmas_restriction or self.readings_restriction
 
 
-# Read the dictionary from JMDict export
-read_dictionary()
-
-# Add our custom tags
-for tag_file_opts in TAGS_FILES_OPTS:
-    if not isinstance(tag_file_opts, tuple):
-        tag_file_opts = (tag_file_opts, {})
-    jiji.tag_dictionary(jiji_dict, '../tags/' + tag_file_opts[0], **tag_file_opts[1])
-
-# Export to jiji YAML format
-jiji_dict.save('../../../dictionaries/japanese/jmdict_english.jiji.yaml')
\ No newline at end of file
+def download_jmdict(metrics):
+    with metrics.stage('download'):
+        return download.download_if_modified(JMDICT_URL, decompress=False)
+
+
+def get_tag_files():
+    return [os.path.join(TAGS_DIRECTORY_PATH, t[0] if isinstance(t, tuple) else t) for t in TAGS_FILES_OPTS]
+
+
+def build_dictionary(metrics, jmdict=None):
+    """Parse, tag and save the dictionary, jmdict is the JMdict file downloaded by download_jmdict"""
+    jmdict = jmdict or download.get_cache_filename(JMDICT_URL)
+    os.makedirs(DICTIONARIES_DIRECTORY, exist_ok=True)
+
+    # Each stage is only run again if its inputs changed, see tools/build_cache.py
+    cache = BuildCache(BUILD_NAME)
+    code_files = [__file__, jiji.__file__]
+    parse_key = cache.stage_key('parse', [jmdict] + code_files)
+    tag_key = cache.stage_key('tag', get_tag_files() + code_files, [parse_key], TAGS_FILES_OPTS)
+    emit_key = cache.stage_key('emit', code_files, [tag_key], OUTPUT_PATH)
+
+    def parse():
+        """Read the dictionary from JMDict export"""
+        with metrics.stage('parse'):
+            jiji_dict = jiji.Dictionary(
+                title="Jim's Breen Japanese dictionary",
+                lang_from='Japanese',
+                lang_to='English',
+                licence='Creative Commons Attribution-ShareAlike Licence (V3.0)'
+            )
+            for entry in read_dictionary(jmdict, NB_PROCESSES):
+                jiji_dict.add_entry(entry)
+            metrics.count('entries_parsed', len(jiji_dict.entries))
+        return jiji_dict
+
+    def tag():
+        """Add our custom tags"""
+        jiji_dict = cache.run_stage('parse', parse_key, parse)
+        with metrics.stage('tag'):
+            summary = jiji.tag_dictionary_files(jiji_dict, TAGS_DIRECTORY_PATH, TAGS_FILES_OPTS)
+        for tag_filename, file_summary in summary.items():
+            metrics.count(f'lemmas_missing.{tag_filename}', len(file_summary['missing']))
+            metrics.count(f'lemmas_ambiguous.{tag_filename}', len(file_summary['ambiguous']))
+        return jiji_dict
+
+    def emit():
+        """Export to jiji YAML format"""
+        jiji_dict = cache.run_stage('tag', tag_key, tag)
+        with metrics.stage('save'):
+            summary = jiji_dict.save(OUTPUT_PATH)
+        metrics.count('entries_saved', summary['nb_entries'])
+        metrics.count('entries_without_sense', len(summary['without_sense']))
+
+    cache.run_stage('emit', emit_key, emit, outputs=[OUTPUT_PATH])
+
+
+def build_inflections(metrics, jmdict=None):
+    """Export the table of the conjugated forms of verbs and adjectives"""
+    jmdict = jmdict or download.get_cache_filename(JMDICT_URL)
+    os.makedirs(DICTIONARIES_DIRECTORY, exist_ok=True)
+    # A cache of its own, the inflections and the dictionary may be built at the same time by tools/build.py
+    cache = BuildCache(INFLECTIONS_BUILD_NAME)
+    inflect_key = cache.stage_key('inflect', [jmdict, inflections.__file__, __file__], params=INFLECTIONS_PATH)
+
+    def inflect():
+        with metrics.stage('inflect'):
+            nb_forms = inflections.write_inflection_table(INFLECTIONS_PATH, iter_inflected_forms(jmdict))
+        metrics.count('inflected_forms', nb_forms)
+
+    cache.run_stage('inflect', inflect_key, inflect, outputs=[INFLECTIONS_PATH])
+
+
+def get_stages():
+    jmdict = download.get_cache_filename(JMDICT_URL)
+    return [
+        BuildStage('download', download_jmdict, outputs=[jmdict]),
+        BuildStage('dictionary', build_dictionary,
+                   inputs=[jmdict, jiji.__file__] + get_tag_files(), outputs=[OUTPUT_PATH]),
+        BuildStage('inflect', build_inflections, inputs=[jmdict, inflections.__file__], outputs=[INFLECTIONS_PATH]),
+    ]
+
+
+if __name__ == '__main__':
+    # Time and memory of each stage, see tools/build_metrics.py
+    metrics = BuildMetrics(BUILD_NAME)
+    jmdict = download_jmdict(metrics)
+    build_dictionary(metrics, jmdict)
+    build_inflections(metrics, jmdict)
+    metrics.write_report(f'{BuildCache(BUILD_NAME).directory}/report.json')
+    print(metrics.format_report())
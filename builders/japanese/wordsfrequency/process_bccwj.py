@@ -1,91 +1,61 @@
-import csv
-from statistics import median
+import os
+import sys
 
-from tools.language_level import get_language_level
+from tools import frequency_lists
+from tools.build import BuildStage
+from tools.build_metrics import BuildMetrics
 
 """
 This script process the BCCWJ japanese words frequency list, and output 12 lists of words
 grouped by language level to be able to later tag the corresponding entries in jiji dictionaries
 Note there are two frequency lists, based on short unit words(suw) and long unit words(luw)
 for our purpose it's better to use the short unit words version.
+It can be run on its own or as part of the whole build, see tools/build.py:
+    python process_bccwj.py [directory of the frequency list, the directory of this script by default]
 """
 
-BCCWJ_TSV_FILE_PATH = './BCCWJ_frequencylist_suw_ver1_0.tsv'
-TAGS_DIRECTORY_PATH = '../tags'
+BUILDER_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+# Paths relative to the directory of the frequency list
+BCCWJ_TSV_FILE = 'BCCWJ_frequencylist_suw_ver1_0.tsv'
+TAGS_DIRECTORY = '../tags'
 STOPWORDS_TAG_FILE = 'stopword.txt'
 FREQ01_EXPRESSIONS_FILE = 'frequent_expressions01.txt'
 FREQ02_EXPRESSIONS_FILE = 'frequent_expressions02.txt'
-RANK_LAST = 1000000
 
-
-# Read Japanese stopwords into a python dictionary
-stopwords = {}
-with open(f"{TAGS_DIRECTORY_PATH}/{STOPWORDS_TAG_FILE}") as f:
-    for l in f.readlines():
-        stopwords[l.strip()] = True
-
-
-def offset_stopword(rank):
-    """Offset word frequency rankings by a small amount to take into account the missing ranks from ignored stopwords"""
-    return max(1, rank - 160)
-
-
-def add_frequent_expressions(file_path, lang_level):
-    """Add frequent expression to frequency lists
-    This is to fix very frequent expressions that do not appear in bccwj because
-    they are parsed differently. Ex: 確かに / 確か|に
-    """
-    with open(file_path) as f:
-        for l in f.readlines():
-            if l.strip() and not l.strip().startswith('#'):
-                lemmas_by_lang_level[lang_level].append(l.strip())
-
-
-def read_bccwj():
-    """Read word frequency TSV file"""
-    lists = dict()
-    with open(BCCWJ_TSV_FILE_PATH, newline='', encoding='utf-8') as freq_file:
-        tsv_in = csv.reader(freq_file, delimiter='\t')
-        next(tsv_in)  # Skip headers row
-        for row in tsv_in:
-            # row => rank	lForm	lemma	pos	subLemma	wType	frequency	pmw	PB_rank	PB_frequency	PB_pmw...
-            lemma = row[2]
-
-            if '■' in lemma:
-                # some entries are broken, with unicode black square in the lemma, skip them
-                continue
-
-            # Ignore lemmas in the stopword list(very very frequent lemmas used for grammar)
-            if lemma in stopwords:
-                continue
-
-            overall_rank = int(row[0])
-            magazines_rank = int(row[11]) if row[12] else RANK_LAST
-            chiebukuro_rank = int(row[32]) if row[32] else RANK_LAST
-            blogs_rank = int(row[35]) if row[35] else RANK_LAST
-
-            lang_level = int(median([
-                get_language_level(offset_stopword(overall_rank)),
-                get_language_level(offset_stopword(magazines_rank)),
-                get_language_level(offset_stopword(chiebukuro_rank)),
-                get_language_level(offset_stopword(blogs_rank))
-            ]))
-
-            if lang_level not in lists:
-                lists[lang_level] = []
-            lists[lang_level].append(lemma)
-
-    return lists
-
-
-lemmas_by_lang_level = read_bccwj()
-add_frequent_expressions(FREQ01_EXPRESSIONS_FILE, 1)
-add_frequent_expressions(FREQ02_EXPRESSIONS_FILE, 2)
-
-# Write frequency lists in tags/ folder
-for lang_level, lemmas in lemmas_by_lang_level.items():
-    if lang_level == 13:
-        # Language level 13 contains very infrequent words that should be ignored
-        continue
-    with open(f"{TAGS_DIRECTORY_PATH}/freq{lang_level:02}.txt", 'w') as out:
-        out.write('\n'.join(sorted(set(lemmas))))
+# row => rank	lForm	lemma	pos	subLemma	wType	frequency	pmw	PB_rank	PB_frequency	PB_pmw...
+# The language level of a lemma is the median of its levels in the whole corpus, magazines, chiebukuro and blogs
+BCCWJ_COLUMNS = {
+    'lemma': 2,
+    # some entries are broken, with unicode black square in the lemma, skip them
+    'skip_lemmas_containing': '■',
+    'ranks': [(0, 0), (11, 12), (32, 32), (35, 35)],
+    # Offset word frequency rankings by a small amount to take into account the missing ranks from ignored stopwords
+    'stopword_rank_offset': 160,
+}
+
+
+def build_frequency_tags(metrics, directory=BUILDER_DIRECTORY):
+    with metrics.stage('frequency'):
+        # Add frequent expressions to frequency lists
+        # This is to fix very frequent expressions that do not appear in bccwj because
+        # they are parsed differently. Ex: 確かに / 確か|に
+        frequency_lists.build_frequency_tags(
+            os.path.join(directory, BCCWJ_TSV_FILE), os.path.join(directory, TAGS_DIRECTORY), BCCWJ_COLUMNS,
+            STOPWORDS_TAG_FILE, extra_lemmas={1: os.path.join(directory, FREQ01_EXPRESSIONS_FILE),
+                                              2: os.path.join(directory, FREQ02_EXPRESSIONS_FILE)}
+        )
+
+
+def get_stages(directory=BUILDER_DIRECTORY):
+    tags_directory = os.path.join(directory, TAGS_DIRECTORY)
+    inputs = [BCCWJ_TSV_FILE, FREQ01_EXPRESSIONS_FILE, FREQ02_EXPRESSIONS_FILE]
+    return [
+        BuildStage('frequency', build_frequency_tags,
+                   inputs=[os.path.join(directory, f) for f in inputs]
+                   + [os.path.join(tags_directory, STOPWORDS_TAG_FILE), frequency_lists.__file__],
+                   optional_outputs=[os.path.join(tags_directory, f) for f in frequency_lists.FREQUENCY_TAG_FILES]),
+    ]
+
+
+if __name__ == '__main__':
+    build_frequency_tags(BuildMetrics('bccwj'), sys.argv[1] if len(sys.argv) > 1 else BUILDER_DIRECTORY)
@@ -1,12 +1,71 @@
 import os
+import re
+import sys
+import gzip
+import json
+import zlib
+import shutil
+import struct
+import tempfile
+import bisect
+import functools
+import itertools
 import yaml
 import string
 import uuid
 import logging
+import sqlite3
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
 
-logging.basicConfig(filename='jiji.log',level=logging.DEBUG)
+# Number of entries written to the YAML file at once when saving a dictionary
+SAVE_CHUNK_SIZE = 1000
+
+# Block compressed dictionaries, see write_compressed_dictionary_file
+COMPRESSED_EXTENSION = '.gz'
+# Size of the YAML text of the entries compressed in each chunk
+COMPRESSED_CHUNK_SIZE = 64 * 1024
+COMPRESSED_TABLE_VERSION = 1
+# Gzip extra subfield holding the chunks table: identifier, table header(version, sorted, number of entries
+# and chunks), then for each chunk its compressed size and the length of its first key followed by the key
+COMPRESSED_TABLE_SUBFIELD = b'JJ'
+COMPRESSED_TABLE_HEADER = struct.Struct('<BBII')
+COMPRESSED_TABLE_ROW = struct.Struct('<IH')
+# The gzip extra field length is 16 bits
+GZIP_EXTRA_MAX_SIZE = 0xffff
+GZIP_FEXTRA = 4
+
+# Sharded dictionaries, see Dictionary.save_shards
+SHARDS_MANIFEST_VERSION = 1
+SHARDS_MANIFEST_EXTENSION = '.manifest.json'
+
+# Tables of the SQLite export, see Dictionary.save_sqlite and tools/sqlite_dictionary.py
+# The lists of each entry are stored in order with their position, clustered by entry
+SQLITE_SCHEMA = """
+CREATE TABLE about (title TEXT, licence TEXT, lang_from TEXT, lang_to TEXT);
+CREATE TABLE entries (id INTEGER PRIMARY KEY, entry_id TEXT, key TEXT NOT NULL);
+CREATE TABLE lemmas (entry INTEGER NOT NULL, position INTEGER NOT NULL, lemma TEXT NOT NULL,
+                     PRIMARY KEY (entry, position)) WITHOUT ROWID;
+CREATE TABLE pronunciations (entry INTEGER NOT NULL, position INTEGER NOT NULL, pronunciation TEXT NOT NULL,
+                             PRIMARY KEY (entry, position)) WITHOUT ROWID;
+CREATE TABLE senses (id INTEGER PRIMARY KEY, entry INTEGER NOT NULL, position INTEGER NOT NULL, sense TEXT NOT NULL);
+CREATE TABLE tags (entry INTEGER NOT NULL, position INTEGER NOT NULL, tag TEXT NOT NULL,
+                   PRIMARY KEY (entry, position)) WITHOUT ROWID;
+"""
+# Created after the bulk insert, building an index at once is faster than updating it for each row
+SQLITE_INDEXES = """
+CREATE INDEX senses_entry ON senses (entry, position);
+CREATE INDEX lemmas_lemma ON lemmas (lemma);
+CREATE INDEX pronunciations_pronunciation ON pronunciations (pronunciation);
+CREATE INDEX tags_tag ON tags (tag, entry);
+"""
+# Full text search over the senses, external content table so the senses are not stored twice
+SQLITE_FTS = """
+CREATE VIRTUAL TABLE senses_fts USING fts5(sense, content='senses', content_rowid='id');
+INSERT INTO senses_fts (senses_fts) VALUES ('rebuild');
+"""
 
 
 class Dictionary:
@@ -20,43 +79,430 @@ class Dictionary:
         self.licence = licence
         self.entries = []
         self.entries_by_lemma = {}
+        self.entries_by_pronunciation = {}
+        # Lemmas and pronunciations in sorted order for prefix/range searches,
+        # keys added since the last search are sorted in lazily by get_sorted_keys
+        self.sorted_keys = []
+        self.unsorted_keys = []
+        # Secondary indexes kept up to date by add_entry, see add_index
+        self.indexes = []
+
+    @classmethod
+    def load(cls, filename):
+        """Read a jiji dictionary from a YAML file, see iter_dictionary_items, or from the manifest of a sharded dictionary"""
+        if filename.endswith(SHARDS_MANIFEST_EXTENSION):
+            return cls.load_shards(filename)
+        dictionary = cls(title='', lang_from='')
+        for key, value in iter_dictionary_items(filename):
+            if key == cls.ABOUT_DICT_KEY:
+                dictionary.set_about(value)
+                continue
+            try:
+                dictionary.add_entry(Entry.from_dict(key, value))
+            except EntryWithoutSense:
+                logging.warning(f"Entry {key} has no sense defined, will skip.")
+        return dictionary
+
+    def set_about(self, about):
+        """Set the title, licence and languages from the _about_this_dictionary information of a YAML file"""
+        self.title = about.get('title', '')
+        self.licence = about.get('licence', '')
+        languages = about.get('languages') or {}
+        self.lang_from = languages.get('from', '')
+        self.lang_to = languages.get('to') or self.lang_from
+
+    def get_about(self):
+        about = OrderedDict()
+        about['title'] = self.title
+        about['licence'] = self.licence
+        about['languages'] = OrderedDict([('from', self.lang_from), ('to', self.lang_to)])
+        return about
+
+    def dump_about(self):
+        """Return the _about_this_dictionary information in YAML, as written at the start of a dictionary file"""
+        return yaml.dump({self.ABOUT_DICT_KEY: self.get_about()}, default_flow_style=False, allow_unicode=True)
 
     def add_entry(self, entry):
         self.entries.append(entry)
-        # Index the entry by lemma
+        # Index the entry by lemma and pronunciation
         for l in entry.lemmas:
-            if l not in self.entries_by_lemma:
-                self.entries_by_lemma[l] = []
-            self.entries_by_lemma[l].append(entry)
+            if l in self.entries_by_lemma:
+                self.entries_by_lemma[l].append(entry)
+                continue
+            # Most lemmas have a single entry, [entry] is smaller than an empty list grown by append
+            self.entries_by_lemma[l] = [entry]
+            if l not in self.entries_by_pronunciation:
+                self.unsorted_keys.append(l)
+        for p in entry.pronunciations:
+            if p in self.entries_by_pronunciation:
+                self.entries_by_pronunciation[p].append(entry)
+                continue
+            self.entries_by_pronunciation[p] = [entry]
+            if p not in self.entries_by_lemma:
+                self.unsorted_keys.append(p)
+        for index in self.indexes:
+            index.add_entry(entry)
+
+    def add_index(self, index):
+        """Register a secondary index, any object with an add_entry(entry) method.
+        The index is fed the entries already in the dictionary, then each new entry as it is added."""
+        for e in self.entries:
+            index.add_entry(e)
+        self.indexes.append(index)
+        return index
 
     def get_entries_by_lemma(self, lemma):
         if not lemma in self.entries_by_lemma:
             return []
         return self.entries_by_lemma[lemma]
 
+    def get_entries_by_pronunciation(self, pronunciation):
+        if not pronunciation in self.entries_by_pronunciation:
+            return []
+        return self.entries_by_pronunciation[pronunciation]
+
+    def get_entries_by_key(self, key):
+        """Return the entries having key as a lemma or as a pronunciation"""
+        entries = self.get_entries_by_lemma(key)
+        by_pronunciation = [e for e in self.get_entries_by_pronunciation(key) if e not in entries]
+        return entries + by_pronunciation if by_pronunciation else entries
+
+    def get_sorted_keys(self):
+        """Return all lemmas and pronunciations in sorted order
+        Keys added since the last call are appended and sorted in, which is close to linear
+        as the list is already mostly sorted"""
+        if self.unsorted_keys:
+            self.sorted_keys += self.unsorted_keys
+            self.sorted_keys.sort()
+            self.unsorted_keys = []
+        return self.sorted_keys
+
+    def iter_range(self, start, end=None):
+        """Yield the (key, entries) of the lemmas and pronunciations >= start and < end, in sorted order"""
+        keys = self.get_sorted_keys()
+        idx = bisect.bisect_left(keys, start)
+        while idx < len(keys) and (end is None or keys[idx] < end):
+            yield keys[idx], self.get_entries_by_key(keys[idx])
+            idx += 1
+
+    def search_prefix(self, prefix, limit=None):
+        """Return the entries with a lemma or pronunciation starting with prefix,
+        in the sorted order of the matching keys"""
+        results = []
+        seen = set()
+        for key, entries in self.iter_range(prefix):
+            if not key.startswith(prefix):
+                break
+            for e in entries:
+                if id(e) not in seen:
+                    seen.add(id(e))
+                    results.append(e)
+            if limit is not None and len(results) >= limit:
+                return results[:limit]
+        return results
+
     def validate(self):
-        """Check validity of the dictionary and display a message for errors / inconsistencies"""
-        pass
+        """Check validity of the dictionary and display a message for errors / inconsistencies
+        Entries sharing a key(only the last one is saved) are reported along with the issues of each
+        entry, see validate_entry. Return the report, see new_validation_report."""
+        report = new_validation_report()
+        keys = set()
+        for e in self.entries:
+            key = e.get_entry_key()
+            if key in keys:
+                add_validation_issue(report, 'duplicate_key', key, 'another entry has the same key, only the last one is saved')
+            keys.add(key)
+            for issue_type, message in validate_entry(e):
+                add_validation_issue(report, issue_type, key, message)
+        report['nb_entries'] = len(self.entries)
+        log_validation_report(report, self.title)
+        return report
 
-    def save(self, filename):
-        """Write the jiji dictionary to a YAML file"""
+    def save(self, filename, sort_keys=False, nb_shards=1):
+        """Write the jiji dictionary to a YAML file
+        Entries are written one at a time in chunks of SAVE_CHUNK_SIZE, see dump_entry, in the order they
+        were added or sorted by key if sort_keys is True, as needed to merge or diff dictionary files
+        With nb_shards > 1, the dictionary is split in several files, see save_shards.
+        A filename ending with .gz gives a block compressed file, see write_compressed_dictionary_file,
+        its entries are always sorted by key so that readers can find the chunk of an entry.
+        Return a summary with the number of entries written and the ids of the entries skipped without sense."""
+        if nb_shards > 1:
+            return self.save_shards(filename, nb_shards, sort_keys)
         self.validate()
-        with open(filename, 'w') as out:
-            # Write about_this_dictionary information
-            about = OrderedDict()
-            about['title'] = self.title
-            about['licence'] = self.licence
-            about['languages'] = OrderedDict([('from', self.lang_from), ('to', self.lang_to)])
-            out.write(yaml.dump({self.ABOUT_DICT_KEY: about}, default_flow_style=False, allow_unicode=True))
-
-            # Write all entries
-            entries = OrderedDict()
-            for e in self.entries:
-                try:
-                    entries[e.get_entry_key()] = e.to_ordered_dict()
-                except EntryWithoutSense:
-                    logging.warning(f"Entry {e.id} has no sense defined, will skip.")
-            out.write(yaml.dump(entries, default_flow_style=False, allow_unicode=True))
+        entries_by_key, without_sense = self.get_entries_to_save()
+        keys = sorted(entries_by_key) if sort_keys or filename.endswith(COMPRESSED_EXTENSION) else entries_by_key
+        write_dictionary_file(filename, self.dump_about(), ((k, entries_by_key[k]) for k in keys))
+        return {'nb_entries': len(entries_by_key), 'without_sense': without_sense}
+
+    def save_shards(self, filename, nb_shards, sort_keys=False, nb_processes=1):
+        """Write the jiji dictionary to nb_shards YAML files that can be loaded in parallel, see load_shards
+        Each entry is written to the shard of each of its lemmas, see get_lemma_shard, so every shard is
+        a valid jiji dictionary holding all the entries of its lemmas. Shards are named after filename:
+        dictionary.jiji.yaml gives dictionary.jiji.shard00.yaml... and the dictionary.jiji.manifest.json
+        manifest with the _about_this_dictionary information and the list of shards, which is returned.
+        Shards are written by nb_processes processes."""
+        self.validate()
+        entries_by_key, without_sense = self.get_entries_to_save()
+        shards_keys = [[] for _ in range(nb_shards)]
+        for key, e in entries_by_key.items():
+            for shard in set(get_lemma_shard(l, nb_shards) for l in e.lemmas):
+                shards_keys[shard].append(key)
+
+        root, ext = os.path.splitext(filename)
+        shards_filenames = [f'{root}.shard{i:02}{ext}' for i in range(nb_shards)]
+        manifest = {
+            'version': SHARDS_MANIFEST_VERSION,
+            self.ABOUT_DICT_KEY: self.get_about(),
+            'partition': 'crc32(UTF-8 lemma) % number of shards',
+            'nb_entries': len(entries_by_key),
+            'shards': [{'filename': os.path.basename(f), 'nb_entries': len(keys)}
+                       for f, keys in zip(shards_filenames, shards_keys)],
+        }
+        about = self.dump_about()
+        sort_keys = sort_keys or filename.endswith(COMPRESSED_EXTENSION)
+        shards_items = [[(k, entries_by_key[k]) for k in (sorted(keys) if sort_keys else keys)] for keys in shards_keys]
+        if nb_processes > 1:
+            with ProcessPoolExecutor(nb_processes) as executor:
+                list(executor.map(write_dictionary_file, shards_filenames, [about] * nb_shards, shards_items))
+        else:
+            for shard_filename, items in zip(shards_filenames, shards_items):
+                write_dictionary_file(shard_filename, about, items)
+        with open(root + SHARDS_MANIFEST_EXTENSION, 'w') as out:
+            json.dump(manifest, out, indent=2, ensure_ascii=False)
+        if without_sense:
+            manifest['without_sense'] = without_sense
+        return manifest
+
+    @classmethod
+    def load_shards(cls, manifest_filename, lemmas=None, nb_processes=1):
+        """Read a dictionary written by save_shards from its manifest, the shards are read by nb_processes processes.
+        If lemmas are given, only the shards holding these lemmas are read: the dictionary has all their entries
+        but is partial. An entry written to several shards is only added once."""
+        with open(manifest_filename) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != SHARDS_MANIFEST_VERSION:
+            raise RuntimeError(f"{manifest_filename} is not a sharded dictionary manifest(version {SHARDS_MANIFEST_VERSION})")
+        shards = manifest['shards']
+        if lemmas is not None:
+            shards = [shards[i] for i in sorted(set(get_lemma_shard(l, len(shards)) for l in lemmas))]
+        directory = os.path.dirname(manifest_filename)
+        shards_filenames = [os.path.join(directory, s['filename']) for s in shards]
+
+        dictionary = cls(title='', lang_from='')
+        dictionary.set_about(manifest[cls.ABOUT_DICT_KEY])
+        keys = set()
+        executor = ProcessPoolExecutor(nb_processes) if nb_processes > 1 else None
+        with executor or nullcontext():
+            if executor:
+                shards_entries = executor.map(read_entries, shards_filenames)
+            else:
+                shards_entries = map(iter_entries, shards_filenames)
+            for entries in shards_entries:
+                for e in entries:
+                    key = e.get_entry_key()
+                    if key not in keys:
+                        keys.add(key)
+                        dictionary.add_entry(e)
+        return dictionary
+
+    def get_entries_to_save(self):
+        """Return the entries to save by key and the ids of the entries skipped because they have no sense, see validate
+        Entries with the same key are merged like in a mapping: the key keeps
+        the position of its first entry but the last entry wins"""
+        entries_by_key = {}
+        without_sense = []
+        for e in self.entries:
+            if not e.senses:
+                without_sense.append(e.id)
+                continue
+            entries_by_key[e.get_entry_key()] = e
+        return entries_by_key, without_sense
+
+    def save_sqlite(self, filename):
+        """Write the jiji dictionary to a SQLite database, with the same entries as save
+        Entries, lemmas, pronunciations, senses and tags are in their own tables, see SQLITE_SCHEMA,
+        with indexes on lemmas, pronunciations and tags, and a FTS5 full text index over the senses.
+        The database is written in a single transaction to a temporary file, then moved to filename.
+        Return a summary like save."""
+        self.validate()
+        entries_by_key, without_sense = self.get_entries_to_save()
+        entries = list(entries_by_key.values())
+        tmp_filename = filename + '.tmp'
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        db = sqlite3.connect(tmp_filename, isolation_level=None)
+        try:
+            # The file is only moved to filename once complete, no need for a journal
+            db.execute('PRAGMA journal_mode = OFF')
+            db.execute('PRAGMA synchronous = OFF')
+            db.execute('BEGIN')
+            execute_sql_script(db, SQLITE_SCHEMA)
+            db.execute('INSERT INTO about VALUES (?, ?, ?, ?)', (self.title, self.licence, self.lang_from, self.lang_to))
+            db.executemany('INSERT INTO entries VALUES (?, ?, ?)',
+                           ((i, str(e.entry_id) if e.entry_id else None, key)
+                            for i, (key, e) in enumerate(entries_by_key.items(), 1)))
+            # Each entry list goes in the table of the same name
+            for table in ('lemmas', 'pronunciations', 'senses', 'tags'):
+                columns = '(entry, position, sense)' if table == 'senses' else ''
+                db.executemany(f'INSERT INTO {table} {columns} VALUES (?, ?, ?)',
+                               ((i, position, value) for i, e in enumerate(entries, 1)
+                                for position, value in enumerate(getattr(e, table))))
+            execute_sql_script(db, SQLITE_INDEXES)
+            try:
+                execute_sql_script(db, SQLITE_FTS)
+            except sqlite3.OperationalError as e:
+                logging.warning(f"Cannot create the full text index of the senses, FTS5 is not available: {e}")
+            db.execute('COMMIT')
+        finally:
+            db.close()
+        os.replace(tmp_filename, filename)
+        return {'nb_entries': len(entries_by_key), 'without_sense': without_sense}
+
+
+def get_lemma_shard(lemma, nb_shards):
+    """Index of the shard of a lemma, stable across runs and Python versions unlike hash()"""
+    return zlib.crc32(lemma.encode()) % nb_shards
+
+
+def write_dictionary_file(filename, about, items):
+    """Write a jiji YAML file from its about information in YAML, see Dictionary.dump_about,
+    and its (key, entry) items, in chunks of SAVE_CHUNK_SIZE entries. Return the number of entries.
+    Files ending with .gz are block compressed, see write_compressed_dictionary_file."""
+    if filename.endswith(COMPRESSED_EXTENSION):
+        return write_compressed_dictionary_file(filename, about, items)
+    nb_entries = 0
+    with open(filename, 'w') as out:
+        out.write(about)
+        chunk = []
+        for key, e in items:
+            chunk.append(dump_entry(key, e.to_ordered_dict()))
+            nb_entries += 1
+            if len(chunk) >= SAVE_CHUNK_SIZE:
+                out.write(''.join(chunk))
+                chunk = []
+        out.write(''.join(chunk))
+    return nb_entries
+
+
+def gzip_member(data, extra=b''):
+    """Compress data as a complete gzip member, with an optional extra field.
+    The modification time is not set so that the same data always gives the same file."""
+    header = struct.pack('<2sBBIBB', b'\x1f\x8b', zlib.DEFLATED, GZIP_FEXTRA if extra else 0, 0, 0, 255)
+    if extra:
+        header += struct.pack('<H', len(extra)) + extra
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(data) + compressor.flush()
+    return header + body + struct.pack('<II', zlib.crc32(data), len(data) & 0xffffffff)
+
+
+def write_compressed_dictionary_file(filename, about, items, chunk_size=COMPRESSED_CHUNK_SIZE):
+    """Write a block compressed jiji YAML file, like dictzip files: it is a gzip file that gunzip decompresses
+    to the usual YAML, made of one gzip member with the about information then one member per chunk of
+    whole entries, of about chunk_size bytes of YAML. The extra field of the first member holds the table
+    of the chunks(compressed size and first key), so readers can decompress only the chunk holding an entry,
+    see tools/compressed_dictionary.py. Return the number of entries."""
+    nb_entries = 0
+    is_sorted = True
+    previous_key = None
+    # (compressed size, first key) of each chunk
+    chunks = []
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(filename))) as compressed:
+        lines, size = [], 0
+        for key, e in items:
+            if previous_key is not None and key < previous_key:
+                is_sorted = False
+            previous_key = key
+            if not lines:
+                first_key = key
+            lines.append(dump_entry(key, e.to_ordered_dict()))
+            size += len(lines[-1])
+            nb_entries += 1
+            if size >= chunk_size:
+                chunks.append((compressed.write(gzip_member(''.join(lines).encode())), first_key))
+                lines, size = [], 0
+        if lines:
+            chunks.append((compressed.write(gzip_member(''.join(lines).encode())), first_key))
+
+        # Consecutive chunks are merged, as several gzip members, until the table fits in the extra field
+        rows = [(s, k.encode()) for s, k in chunks]
+        max_size = GZIP_EXTRA_MAX_SIZE - 4 - COMPRESSED_TABLE_HEADER.size
+        while sum(COMPRESSED_TABLE_ROW.size + len(k) for _, k in rows) > max_size:
+            rows = [(sum(s for s, _ in pair), pair[0][1]) for pair in zip(rows[::2], rows[1::2] + [(0, b'')])]
+        table = COMPRESSED_TABLE_HEADER.pack(COMPRESSED_TABLE_VERSION, is_sorted, nb_entries, len(rows))
+        table += b''.join(COMPRESSED_TABLE_ROW.pack(s, len(k)) + k for s, k in rows)
+        extra = COMPRESSED_TABLE_SUBFIELD + struct.pack('<H', len(table)) + table
+
+        with open(filename, 'wb') as out:
+            out.write(gzip_member(about.encode(), extra))
+            compressed.seek(0)
+            shutil.copyfileobj(compressed, out)
+    return nb_entries
+
+
+def read_compressed_table(f):
+    """Read the chunks table of a block compressed file, see write_compressed_dictionary_file.
+    Return the table header(version, sorted, number of entries), the about information in YAML,
+    the (offset, compressed size, first key) of each chunk, or None if the file is not block compressed."""
+    header = f.read(12)
+    if len(header) < 12 or header[:2] != b'\x1f\x8b' or not header[3] & GZIP_FEXTRA:
+        return None
+    extra = f.read(struct.unpack_from('<H', header, 10)[0])
+    position = 0
+    table = None
+    while position + 4 <= len(extra):
+        subfield_id, length = extra[position:position + 2], struct.unpack_from('<H', extra, position + 2)[0]
+        if subfield_id == COMPRESSED_TABLE_SUBFIELD:
+            table = extra[position + 4:position + 4 + length]
+        position += 4 + length
+    if table is None:
+        return None
+    version, is_sorted, nb_entries, nb_chunks = COMPRESSED_TABLE_HEADER.unpack_from(table, 0)
+    if version != COMPRESSED_TABLE_VERSION:
+        raise RuntimeError(f"Unsupported block compressed dictionary version {version}")
+
+    # The about member ends the header, its end is found by decompressing it
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    about = b''
+    while not decompressor.eof:
+        block = f.read(COMPRESSED_CHUNK_SIZE)
+        if not block:
+            raise RuntimeError("Truncated block compressed dictionary")
+        about += decompressor.decompress(block)
+    offset = f.tell() - len(decompressor.unused_data) + 8
+
+    chunks = []
+    position = COMPRESSED_TABLE_HEADER.size
+    for _ in range(nb_chunks):
+        size, key_length = COMPRESSED_TABLE_ROW.unpack_from(table, position)
+        position += COMPRESSED_TABLE_ROW.size
+        chunks.append((offset, size, table[position:position + key_length].decode()))
+        position += key_length
+        offset += size
+    return (version, bool(is_sorted), nb_entries), about.decode(), chunks
+
+
+def decompress_members(data):
+    """Decompress consecutive gzip members"""
+    text = []
+    while data:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        text.append(decompressor.decompress(data))
+        data = decompressor.unused_data
+    return b''.join(text).decode()
+
+
+def open_dictionary_file(filename):
+    """Open a jiji YAML file for reading as text, gzipped and block compressed files are decompressed"""
+    if filename.endswith(COMPRESSED_EXTENSION):
+        return gzip.open(filename, 'rt', encoding='utf-8')
+    return open(filename)
+
+
+def execute_sql_script(db, script):
+    """Execute the statements of a SQL script one by one, unlike executescript it does not commit first"""
+    for statement in script.split(';'):
+        if statement.strip():
+            db.execute(statement)
 
 
 class EntryWithoutSense(Exception):
@@ -64,13 +510,50 @@ class EntryWithoutSense(Exception):
 
 
 class Entry:
+    # Dictionaries can have hundreds of thousands of entries, slots save the memory of a __dict__ per entry
+    __slots__ = ('entry_id', 'lemmas', 'senses', 'tags', 'pronunciations')
+
     def __init__(self, entry_id=None):
-        self.id = entry_id or uuid.uuid4()
+        self.entry_id = entry_id
         self.lemmas = []
         self.senses = []
         self.tags = []
         self.pronunciations = []
 
+    @property
+    def id(self):
+        """The entry id, a random UUID is only generated when the entry was created without id"""
+        if not self.entry_id:
+            self.entry_id = uuid.uuid4()
+        return self.entry_id
+
+    @id.setter
+    def id(self, entry_id):
+        self.entry_id = entry_id
+
+    @classmethod
+    def from_dict(cls, key, properties):
+        """Create an entry from its key and properties as read in a jiji YAML file"""
+        entry = cls()
+        if not isinstance(properties, dict):
+            properties = {}
+        for l in str(key).split(','):
+            entry.add_lemma(l)
+        # Empty values are loaded as None by YAML, they are missing senses and not the 'None' sense
+        if properties.get('senses') is not None:
+            entry.senses = [str(s) for s in properties['senses'] if s is not None]
+        elif properties.get('sense') is not None:
+            entry.senses = [str(properties['sense'])]
+        if not entry.senses:
+            raise EntryWithoutSense()
+        for p in str(properties.get('pronunciation') or '').split(','):
+            if p.strip():
+                entry.add_pronunciation(p.strip())
+        for t in str(properties.get('tags') or '').split(','):
+            if t.strip():
+                entry.add_tag(t.strip())
+        return entry
+
     def add_lemma(self, lemma):
         lemma = lemma.strip()
         if lemma not in self.lemmas:
@@ -97,7 +580,8 @@ class Entry:
         if ',' in tag:
             raise RuntimeError(f"tag must not contain a comma: {tag}")
         if tag not in self.tags:
-            self.tags.append(tag)
+            # Tags come from a small vocabulary(nf01, freq03, jlpt2...), share one string per tag
+            self.tags.append(sys.intern(tag))
 
     def get_entry_key(self):
         return ', '.join([l for l in self.lemmas])
@@ -117,51 +601,407 @@ class Entry:
         return entry
 
 
+# Strings that PyYAML would not write as a plain scalar in block context(see yaml.emitter.Emitter.analyze_scalar)
+# this is on purpose a bit stricter than PyYAML, the few strings matched for nothing are just dumped by PyYAML
+YAML_NOT_PLAIN = re.compile(
+    r"^[#,\[\]{}&*!|>'\"%@`?:\- ]|^---|^\.\.\.| $|: | #|:$"
+    r"|[^\x20-\x7E\xA0-\u2027\u202A-\uD7FF\uE000-\uFEFE\uFF00-\uFFFD\U00010000-\U0010FFFE]"
+)
+YAML_LINE_WIDTH = 80
+YAML_SIMPLE_KEY_MAX_LENGTH = 127
+yaml_resolver = yaml.resolver.Resolver()
+# Only strings starting with one of these characters can be resolved to something else than a str (bool, int, null...)
+YAML_IMPLICIT_FIRST_CHARS = frozenset(yaml_resolver.yaml_implicit_resolvers)
+
+
+def is_plain_yaml_text(value):
+    """Check that a string can be written as a plain YAML scalar, i.e. it reads back as the same string"""
+    return (value
+            and not YAML_NOT_PLAIN.search(value)
+            and (value[0] not in YAML_IMPLICIT_FIRST_CHARS
+                 or yaml_resolver.resolve(yaml.ScalarNode, value, (True, False)) == yaml_resolver.DEFAULT_SCALAR_TAG))
+
+
+def is_plain_yaml_scalar(value, column):
+    """Check that a string starting at the given column would be written by PyYAML as is,
+    without quotes and on a single line"""
+    return column + len(value) <= YAML_LINE_WIDTH and is_plain_yaml_text(value)
+
+
+def dump_entry(key, entry):
+    """Dump one dictionary entry to YAML, as yaml.dump would inside the whole dictionary mapping
+    The jiji format is simple enough that most entries can be written directly, much faster than
+    with PyYAML. Entries with strings that need quoting or folding are still dumped by PyYAML."""
+    lines = [key, ':\n']
+    plain = len(key) <= YAML_SIMPLE_KEY_MAX_LENGTH and is_plain_yaml_scalar(key, 0)
+    for prop, value in entry.items():
+        if not plain:
+            break
+        if isinstance(value, list):
+            lines += ['  ', prop, ':\n']
+            for v in value:
+                plain = plain and is_plain_yaml_scalar(v, 4)
+                lines += ['  - ', v, '\n']
+        else:
+            plain = is_plain_yaml_scalar(value, len(prop) + 4)
+            lines += ['  ', prop, ': ', value, '\n']
+    if not plain:
+        return yaml.dump({key: entry}, default_flow_style=False, allow_unicode=True)
+    return ''.join(lines)
+
+
+def iter_dictionary_items(filename):
+    """Read a jiji YAML file and yield its (key, properties) items one at a time, including the
+    _about_this_dictionary item. Entries are parsed line by line when they follow the simple jiji
+    format, otherwise each entry is loaded by PyYAML on its own. Only files that are not a
+    block mapping(flow style, explicit documents, ...) are loaded by PyYAML at once."""
+    with open_dictionary_file(filename) as f:
+        for lines in iter_dictionary_blocks(f):
+            if lines is None:
+                f.seek(0)
+                yield from (yaml.safe_load(f) or {}).items()
+                return
+            yield from parse_entry_lines(lines)
+
+
+def iter_dictionary_blocks(f):
+    """Yield the lines of each item of a jiji YAML file: its key line followed by its properties lines.
+    None is yielded instead if the file is not a block mapping and must be loaded by PyYAML at once."""
+    lines = []
+    for line in f:
+        if not lines:
+            if line[0] in '#\n':
+                continue
+            if line[0] in ' :' or line.startswith(('---', '...', '%', '{', '[', '- ', '? ')):
+                yield None
+                return
+        elif line[0] in ' #:\n':
+            # Entry property, comment or continuation of the current entry
+            lines.append(line)
+            continue
+        else:
+            yield lines
+        lines = [line]
+    if lines:
+        yield lines
+
+
+def parse_entry_lines(lines):
+    """Parse the YAML lines of one dictionary entry and yield its (key, properties) item"""
+    key = lines[0].rstrip('\n')
+    properties = {}
+    senses = None
+    plain = key.endswith(':') and is_plain_yaml_text(key[:-1])
+    for line in lines[1:]:
+        if not plain:
+            break
+        line = line.rstrip('\n')
+        stripped = line.lstrip()
+        if not stripped or stripped[0] == '#':
+            continue
+        if senses is not None and line.startswith('  - '):
+            plain = is_plain_yaml_text(line[4:])
+            senses.append(line[4:])
+        elif line == '  senses:':
+            senses = properties['senses'] = []
+        else:
+            senses = None
+            prop, sep, value = line[2:].partition(': ')
+            plain = (line.startswith('  ') and sep and prop in ('sense', 'pronunciation', 'tags')
+                     and is_plain_yaml_text(value))
+            properties[prop] = value
+    if plain:
+        yield key[:-1], properties
+    else:
+        yield from (yaml.safe_load(''.join(lines)) or {}).items()
+
+
+def iter_entries(filename):
+    """Read the entries of a jiji YAML file one at a time, without loading the whole dictionary in memory"""
+    for key, value in iter_dictionary_items(filename):
+        if key == Dictionary.ABOUT_DICT_KEY:
+            continue
+        try:
+            yield Entry.from_dict(key, value)
+        except EntryWithoutSense:
+            logging.warning(f"Entry {key} has no sense defined, will skip.")
+
+
+def read_entries(filename):
+    """List of the entries of a jiji YAML file, see iter_entries, to read files in other processes"""
+    return list(iter_entries(filename))
+
+
+# Restriction at the start of a sense as written by Entry.add_sense: "(form, form)gloss", the forms have no spaces
+# and the gloss follows the parenthesis without a space, unlike glosses such as "(in) the house"
+SENSE_RESTRICTION_REGEX = re.compile(r'^\(([^()\s,]+(?:, [^()\s,]+)*)\)(?!\s)')
+# Number of entries validated at once by each process, see validate_dictionary_file
+VALIDATE_CHUNK_SIZE = 5000
+# Number of issues of each type shown in the logs, all of them are in the report
+NB_LOGGED_ISSUES = 10
+
+
+def split_sense_restriction(sense):
+    """Return the forms of the restriction at the start of a sense, see Entry.add_sense, and the rest of the sense
+    The forms are None if the sense does not start with a restriction."""
+    match = SENSE_RESTRICTION_REGEX.match(sense)
+    if not match:
+        return None, sense
+    return match.group(1).split(', '), sense[match.end():]
+
+
+def new_validation_report():
+    """Validation results: the number of entries checked, the number of issues by type
+    and the list of issues as {'type', 'key', 'message'} dicts, so they can be written in JSON"""
+    return {'nb_entries': 0, 'nb_issues': OrderedDict(), 'issues': []}
+
+
+def add_validation_issue(report, issue_type, key, message):
+    report['nb_issues'][issue_type] = report['nb_issues'].get(issue_type, 0) + 1
+    report['issues'].append({'type': issue_type, 'key': key, 'message': message})
+
+
+def log_validation_report(report, name):
+    for issue_type, nb_issues in report['nb_issues'].items():
+        keys = [i['key'] for i in report['issues'] if i['type'] == issue_type][:NB_LOGGED_ISSUES]
+        logging.warning(f"{name}: {nb_issues} issues {issue_type}, first entries: {', '.join(map(str, keys))}")
+
+
+def validate_entry(entry):
+    """Return the issues of an entry as (type, message) pairs:
+    - without_sense: the entry has no sense, it cannot be saved
+    - comma_in_lemma, comma_in_pronunciation, comma_in_tag: commas separate the values in jiji files
+    - unknown_restriction: a sense restriction references a form that is not a lemma or pronunciation of the entry
+    A sense starting with a parenthesis is only considered restricted if the parenthesis is written like the ones of
+    Entry.add_sense, see SENSE_RESTRICTION_REGEX, otherwise it is a gloss like "(in) the house" """
+    issues = []
+    if not entry.senses:
+        issues.append(('without_sense', 'the entry has no sense'))
+    for issue_type, values in (('comma_in_lemma', entry.lemmas), ('comma_in_pronunciation', entry.pronunciations),
+                               ('comma_in_tag', entry.tags)):
+        for value in values:
+            if ',' in value:
+                issues.append((issue_type, f'{value} contains a comma'))
+    forms = None
+    for sense in entry.senses:
+        if sense[:1] != '(':
+            continue
+        restriction, _ = split_sense_restriction(sense)
+        if restriction is None:
+            continue
+        if forms is None:
+            forms = set(entry.lemmas + entry.pronunciations)
+        unknown = [r for r in restriction if r not in forms]
+        if unknown:
+            issues.append(('unknown_restriction', f"{', '.join(unknown)} in the restriction of {sense} are not forms of the entry"))
+    return issues
+
+
+def validate_entry_blocks(blocks):
+    """Parse and validate the entries of YAML blocks, see iter_dictionary_blocks, in a worker process
+    Return the number of entries, their issues as (type, key, message) and their keys."""
+    nb_entries = 0
+    issues = []
+    keys = []
+    for lines in blocks:
+        try:
+            items = list(parse_entry_lines(lines))
+        except yaml.YAMLError as e:
+            issues.append(('invalid_yaml', lines[0].rstrip('\n').rstrip(':'), str(e).replace('\n', ' ')))
+            continue
+        for key, value in items:
+            if key == Dictionary.ABOUT_DICT_KEY:
+                continue
+            nb_entries += 1
+            issues.extend(validate_item(key, value))
+            keys.append(get_validation_key(key))
+    return nb_entries, issues, keys
+
+
+def get_validation_key(key):
+    """Key of an entry as read in a jiji file, with its lemmas stripped like Entry.from_dict"""
+    return ', '.join(l.strip() for l in str(key).split(','))
+
+
+def find_duplicate_keys(filename, fingerprints):
+    """Yield the keys of a jiji file seen before in the file, only the keys with one of the given fingerprints are kept"""
+    seen = set()
+    with open_dictionary_file(filename) as f:
+        for lines in iter_dictionary_blocks(f):
+            try:
+                items = list(parse_entry_lines(lines))
+            except yaml.YAMLError:
+                continue
+            for key, _ in items:
+                key = get_validation_key(key)
+                if key == Dictionary.ABOUT_DICT_KEY or hash(key) not in fingerprints:
+                    continue
+                if key in seen:
+                    yield key
+                seen.add(key)
+
+
+def validate_item(key, value):
+    """Issues of an entry as read in a jiji file, see validate_entry"""
+    try:
+        entry = Entry.from_dict(key, value)
+    except EntryWithoutSense:
+        return [('without_sense', str(key), 'the entry has no sense')]
+    return [(issue_type, str(key), message) for issue_type, message in validate_entry(entry)]
+
+
+def validate_dictionary_file(filename, nb_processes=1):
+    """Validate a jiji YAML file like Dictionary.validate, without loading it in memory
+    Entries are read one chunk of VALIDATE_CHUNK_SIZE entries at a time, and validated by nb_processes processes.
+    To find the duplicate keys, which are lost when the file is loaded, the hash of every key is kept: memory
+    still grows with the number of entries, as does the list of issues, but much less than with the entries.
+    Keys with the same hash are compared in a second pass over the file, so that only real duplicates are reported.
+    Return the report, see new_validation_report."""
+    report = new_validation_report()
+    fingerprints = set()
+    # Fingerprints seen several times, of duplicate keys or of different keys with the same hash
+    duplicate_fingerprints = set()
+
+    def add_results(nb_entries, issues, keys):
+        report['nb_entries'] += nb_entries
+        for issue in issues:
+            add_validation_issue(report, *issue)
+        for key in keys:
+            fingerprint = hash(key)
+            if fingerprint in fingerprints:
+                duplicate_fingerprints.add(fingerprint)
+            fingerprints.add(fingerprint)
+
+    with open_dictionary_file(filename) as f:
+        blocks = iter_dictionary_blocks(f)
+        first_blocks = list(itertools.islice(blocks, 1))
+        if first_blocks == [None]:
+            # Not a block mapping, the file is loaded at once and duplicate keys cannot be seen
+            f.seek(0)
+            items = [(k, v) for k, v in (yaml.safe_load(f) or {}).items() if k != Dictionary.ABOUT_DICT_KEY]
+            add_results(len(items), [i for k, v in items for i in validate_item(k, v)], [])
+        else:
+            chunks = iter(lambda: list(itertools.islice(blocks, VALIDATE_CHUNK_SIZE)), [])
+            chunks = itertools.chain([first_blocks], chunks)
+            if nb_processes <= 1:
+                for chunk in chunks:
+                    add_results(*validate_entry_blocks(chunk))
+            else:
+                # Only a few chunks are queued so that memory usage stays flat, like in read_dictionary of the JMdict builder
+                with ProcessPoolExecutor(nb_processes) as executor:
+                    pending = deque()
+                    for chunk in chunks:
+                        pending.append(executor.submit(validate_entry_blocks, chunk))
+                        if len(pending) > 2 * nb_processes:
+                            add_results(*pending.popleft().result())
+                    while pending:
+                        add_results(*pending.popleft().result())
+    fingerprints.clear()
+    for key in find_duplicate_keys(filename, duplicate_fingerprints) if duplicate_fingerprints else ():
+        add_validation_issue(report, 'duplicate_key', key, 'another entry has the same key, only the last one is loaded')
+    log_validation_report(report, filename)
+    return report
+
+
 def tag_dictionary(dict, tag_filepath, tag_multiple_entries=True, pick_lowest_tag=True, add_line_number=False):
     """Add tags to a dictionary entries based on a text file containing lemmas.
     The text file must contain one lemma per line, the corresponding entries in the
     dictionary will be tagged with the name of the text file.
     """
-    basename = os.path.basename(tag_filepath)
-    filename = os.path.splitext(basename)[0]
-    line_number = 0
+    tag_file_opts = (os.path.basename(tag_filepath), {
+        'tag_multiple_entries': tag_multiple_entries,
+        'pick_lowest_tag': pick_lowest_tag,
+        'add_line_number': add_line_number,
+    })
+    return tag_dictionary_files(dict, os.path.dirname(tag_filepath), [tag_file_opts])
+
+
+def tag_dictionary_files(dict, tags_directory, tag_files_opts):
+    """Add tags to a dictionary entries based on several tag files, see tag_dictionary.
+    tag_files_opts lists the files of tags_directory to use, in order, each file being
+    a name or a (name, tag_dictionary options) tuple. This gives the same tags as calling
+    tag_dictionary for each file, but the numbered tags of each entry are tracked by name,
+    see get_numbered_tags, and only written back to the entries at the end.
+    Return a summary of the lemmas that were missing or ambiguous in the dictionary by tag file name."""
+    numbered_tags_by_entry = {}
+    order = itertools.count()
+    summary = OrderedDict()
+    for tag_file_opts in tag_files_opts:
+        if not isinstance(tag_file_opts, tuple):
+            tag_file_opts = (tag_file_opts, {})
+        tag_filename, opts = tag_file_opts
+        summary[tag_filename] = read_tag_file(dict, os.path.join(tags_directory, tag_filename),
+                                              numbered_tags_by_entry, order, **opts)
+
+    for entry, numbered_tags in numbered_tags_by_entry.values():
+        tags = [t for v in numbered_tags.values() for t in (v if isinstance(v, list) else [v])]
+        entry.tags = [t for t, _, _ in sorted(tags, key=lambda t: t[2])]
+
+    for tag_filename, file_summary in summary.items():
+        if file_summary['missing']:
+            logging.warning(f"Cannot tag {len(file_summary['missing'])} lemmas of {tag_filename} because they were not found in the dictionary.")
+        if file_summary['ambiguous']:
+            logging.warning(f"Cannot tag {len(file_summary['ambiguous'])} lemmas of {tag_filename} because there are more than one entry in the dictionary.")
+    return summary
+
+
+def read_tag_file(dict, tag_filepath, numbered_tags_by_entry, order, tag_multiple_entries=True, pick_lowest_tag=True, add_line_number=False):
+    """Tag the entries of the lemmas of a tag file. Numbered tags like freq1 / freq2 / ... are only
+    allowed once per entry, the lowest number is kept by convention(the highest without pick_lowest_tag).
+    The tags are added to the numbered tags of the entries in numbered_tags_by_entry"""
+    filename = os.path.splitext(os.path.basename(tag_filepath))[0]
+    factor = 1 if pick_lowest_tag else -1
+    summary = {'missing': [], 'ambiguous': []}
+    tag, name, number = filename, *split_numbered_tag(filename)
     with open(tag_filepath) as f:
-        lines = f.readlines()
-        for l in lines:
-            line_number += 1
+        for line_number, l in enumerate(f, 1):
             lemma = l.strip()
             entries = dict.get_entries_by_lemma(lemma)
             if not entries:
-                logging.warning(f"Cannot tag lemma {lemma} because it was not found in the dictionary.")
+                summary['missing'].append(lemma)
+                continue
             elif not tag_multiple_entries and len(entries) > 1:
-                entries_ids = ', '.join([e.id for e in entries])
-                logging.warning(f"Cannot tag lemma {lemma} because there are more than one entry in the dictionary {entries_ids}.")
-            else:
-                lemma_tag = (filename + str(line_number)) if add_line_number else filename
-                for e in entries:
-                    tag_entry(e, lemma_tag, pick_lowest_tag)
+                summary['ambiguous'].append(lemma)
+                continue
+            if add_line_number:
+                tag, name, number = filename + str(line_number), *split_numbered_tag(filename + str(line_number))
+            for e in entries:
+                if id(e) not in numbered_tags_by_entry:
+                    numbered_tags_by_entry[id(e)] = (e, get_numbered_tags(e))
+                numbered_tags = numbered_tags_by_entry[id(e)][1]
+                same_numbered_tag = numbered_tags.get(name)
+                if not same_numbered_tag:
+                    numbered_tags[name] = (tag, number, next(order))
+                elif isinstance(same_numbered_tag, list):
+                    if all(t != tag for t, _, _ in same_numbered_tag):
+                        raise RuntimeError(f"entry {e.id} has multiple occurrences of numbered tag")
+                elif same_numbered_tag[0] != tag and number * factor < same_numbered_tag[1] * factor:
+                    numbered_tags[name] = (tag, number, next(order))
+    return summary
 
 
-def tag_entry(entry, tag, pick_lowest_tag):
-    """Add a tag to a dictionary entry
-    In case of numbered tag like freq1 / freq2 / ..., only one number is allowed
-    and for now we pick the lowest by convention.
-    """
-    if tag in entry.tags:
-        return
-    same_numbered_tag = [t for t in entry.tags if t.rstrip(string.digits) == tag.rstrip(string.digits)]
-    if not same_numbered_tag:
-        entry.add_tag(tag)
-        return
-    # There is already a numbered tag identical to this one, pick the lowest number
-    if len(same_numbered_tag) > 1:
-        raise RuntimeError(f"entry {entry.id} has multiple occurrences of numbered tag")
-    same_numbered_tag = same_numbered_tag[0]
-    idx = len(tag.rstrip(string.digits))
-    factor = 1 if pick_lowest_tag else -1
-    if int(tag[idx:]) * factor < int(same_numbered_tag[idx:]) * factor:
-        entry.tags.remove(same_numbered_tag)
-        entry.add_tag(tag)
+@functools.lru_cache(maxsize=None)
+def split_numbered_tag(tag):
+    """Split a tag like freq03 into its name and number: ('freq', 3), number is None for tags without number"""
+    name = tag.rstrip(string.digits)
+    return name, int(tag[len(name):]) if len(name) < len(tag) else None
+
+
+def get_numbered_tags(entry):
+    """Return the tags of an entry by name, as (tag, number, order) tuples, or a list of them
+    when the entry already has several tags with the same name. The order of the current tags
+    is negative so that tags added afterwards with a positive order come after them"""
+    numbered_tags = {}
+    for position, t in enumerate(entry.tags):
+        name, number = split_numbered_tag(t)
+        numbered_tag = (t, number, position - len(entry.tags))
+        if name not in numbered_tags:
+            numbered_tags[name] = numbered_tag
+        elif isinstance(numbered_tags[name], list):
+            numbered_tags[name].append(numbered_tag)
+        else:
+            numbered_tags[name] = [numbered_tags[name], numbered_tag]
+    return numbered_tags
 
 
 # Somehow yaml needs some strange initialization to work with OrderedDict
@@ -0,0 +1,32 @@
+import jiji
+from tools.sense_index import SenseIndex
+
+
+def make_entry(lemma, pronunciation, senses):
+    entry = jiji.Entry()
+    entry.add_lemma(lemma)
+    entry.add_pronunciation(pronunciation)
+    entry.senses = senses
+    return entry
+
+
+def test_restriction_is_not_indexed():
+    sense_index = SenseIndex()
+    entry = make_entry('猫', 'ねこ', ['(ねこ)cat', '(猫, ねこ)feline'])
+    sense_index.add_entry(entry)
+    assert [e for e, _ in sense_index.search('cat')] == [entry]
+    assert sense_index.search('ねこ') == []
+    assert sense_index.search('猫') == []
+
+
+def test_gloss_starting_with_a_parenthesis_is_searchable():
+    sense_index = SenseIndex()
+    house_cat = make_entry('家猫', 'いえねこ', ['(in) the house cat'])
+    parents = make_entry('親', 'おや', ["(one's) parents"])
+    # A parenthesis written without a space before the gloss but that is not a form of the entry
+    dog = make_entry('犬', 'いぬ', ['(domestic)dog'])
+    for entry in (house_cat, parents, dog):
+        sense_index.add_entry(entry)
+    assert [e for e, _ in sense_index.search('in')] == [house_cat]
+    assert [e for e, _ in sense_index.search('one')] == [parents]
+    assert [e for e, _ in sense_index.search('domestic')] == [dog]
@@ -0,0 +1,36 @@
+import jiji
+
+
+def make_entry(senses):
+    entry = jiji.Entry()
+    entry.add_lemma('猫')
+    entry.add_pronunciation('ねこ')
+    entry.senses = senses
+    return entry
+
+
+def get_issues(entry, issue_type):
+    return [message for t, message in jiji.validate_entry(entry) if t == issue_type]
+
+
+def test_known_restriction():
+    assert get_issues(make_entry(['(ねこ)cat', '(猫, ねこ)feline']), 'unknown_restriction') == []
+
+
+def test_single_unknown_form():
+    issues = get_issues(make_entry(['(ネコ)cat']), 'unknown_restriction')
+    assert len(issues) == 1 and 'ネコ' in issues[0]
+
+
+def test_all_forms_unknown():
+    issues = get_issues(make_entry(['(ネコ, 貓)cat']), 'unknown_restriction')
+    assert len(issues) == 1 and 'ネコ, 貓' in issues[0]
+
+
+def test_some_forms_unknown():
+    issues = get_issues(make_entry(['(猫, ネコ)cat']), 'unknown_restriction')
+    assert len(issues) == 1 and issues[0].startswith('ネコ in')
+
+
+def test_gloss_starting_with_a_parenthesis():
+    assert get_issues(make_entry(['(in) the house cat', "(one's) parents", '(a, b) c']), 'unknown_restriction') == []
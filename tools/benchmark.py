@@ -0,0 +1,266 @@
+import os
+import gc
+import sys
+import json
+import time
+import pickle
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import importlib.util
+
+import jiji
+from tools import synthetic_data
+from tools.kana_index import KanaIndex
+from tools.download import CACHE_DIRECTORY
+
+"""
+Benchmarks of the dictionary operations and builders on synthetic data, see tools/synthetic_data.py
+For each dictionary size, it measures the time and peak memory of parsing JMdict, add_entry, tagging,
+save, load, lookups and the kana normalized index, and of the frequency lists builders(BCCWJ, Lexique)
+which are run as scripts.
+Results are written in JSON and compared to a stored baseline to catch regressions:
+    python -m tools.benchmark --size 10000 --size 100000 --output results.json
+    python -m tools.benchmark --size 10000 --save-baseline
+Generated inputs are kept in the downloads cache, so the same size and seed is only generated once.
+"""
+
+CURR_DIR = os.path.dirname(os.path.realpath(__file__))
+REPO_DIR = os.path.dirname(CURR_DIR)
+WORK_DIRECTORY = f'{CURR_DIR}/{CACHE_DIRECTORY}/benchmarks'
+BASELINE_PATH = f'{CURR_DIR}/benchmark_baseline.json'
+JMDICT_BUILDER_PATH = f'{REPO_DIR}/builders/japanese/english-jmdict/process_jmdict.py'
+BCCWJ_BUILDER_PATH = f'{REPO_DIR}/builders/japanese/wordsfrequency/process_bccwj.py'
+LEXIQUE_BUILDER_PATH = f'{REPO_DIR}/builders/french/wordsfrequency/process_lexique.py'
+DEFAULT_SIZES = [10000]
+NB_LOOKUPS = 10000
+# A benchmark is reported as a regression when it is that much slower or bigger than the baseline
+DEFAULT_TOLERANCE = 0.2
+# Run a builder script with its arguments and print its peak resident memory in KB
+MAX_RSS_SCRIPT = ('import sys, runpy, resource; sys.argv = sys.argv[1:]; '
+                  'runpy.run_path(sys.argv[0], run_name="__main__"); '
+                  'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)')
+
+
+def load_jmdict_builder():
+    spec = importlib.util.spec_from_file_location('process_jmdict', JMDICT_BUILDER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(setup, run, repeat=1, trace_memory=True):
+    """Measure run(setup()), setup is not measured so each run gets fresh data.
+    The time is the best of repeat runs, the peak memory is measured by an additional run with tracemalloc
+    since tracing slows down allocations."""
+    result = {'seconds': None, 'cpu_seconds': None}
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        start, start_cpu = time.perf_counter(), time.process_time()
+        run(state)
+        seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - start_cpu
+        if result['seconds'] is None or seconds < result['seconds']:
+            result['seconds'], result['cpu_seconds'] = seconds, cpu_seconds
+        del state
+    if trace_memory:
+        state = setup()
+        gc.collect()
+        tracemalloc.start()
+        run(state)
+        result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def measure_script(script_path, directory):
+    """Measure a builder script run in its own process on the files of directory,
+    memory is its peak resident memory"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', MAX_RSS_SCRIPT, script_path, directory], cwd=directory, env=env,
+                             stdout=subprocess.PIPE, check=True, text=True)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'max_rss_bytes': int(process.stdout.split()[-1]) * 1024}
+
+
+def generate_inputs(size, seed):
+    """Generate the synthetic inputs of a size in their own directory, unless it was already done"""
+    directory = f'{WORK_DIRECTORY}/{size}-{seed}'
+    done_marker = f'{directory}/.generated'
+    if os.path.exists(done_marker):
+        return directory
+    print(f'Generate synthetic inputs with {size} entries in {directory}')
+    os.makedirs(f'{directory}/japanese/tags', exist_ok=True)
+    os.makedirs(f'{directory}/japanese/wordsfrequency', exist_ok=True)
+    os.makedirs(f'{directory}/french/tags', exist_ok=True)
+    os.makedirs(f'{directory}/french/wordsfrequency', exist_ok=True)
+
+    synthetic_data.generate_jmdict(f'{directory}/JMdict_e.gz', size, seed)
+
+    lemmas = synthetic_data.generate_bccwj(f'{directory}/japanese/wordsfrequency/BCCWJ_frequencylist_suw_ver1_0.tsv', size, seed)
+    synthetic_data.write_word_list(f'{directory}/japanese/tags/stopword.txt', lemmas[:100])
+    synthetic_data.write_word_list(f'{directory}/japanese/wordsfrequency/frequent_expressions01.txt', lemmas[100:150])
+    synthetic_data.write_word_list(f'{directory}/japanese/wordsfrequency/frequent_expressions02.txt', lemmas[150:200])
+
+    lemmas = synthetic_data.generate_lexique(f'{directory}/french/wordsfrequency/Lexique382.tsv', size, seed)
+    synthetic_data.write_word_list(f'{directory}/french/tags/stopword.txt', lemmas[:100])
+
+    with open(done_marker, 'w'):
+        pass
+    return directory
+
+
+def run_benchmarks(size, seed=0, repeat=1, trace_memory=True):
+    """Run all the benchmarks for a dictionary size and return their measures by name"""
+    directory = generate_inputs(size, seed)
+    process_jmdict = load_jmdict_builder()
+    results = {}
+
+    def new_dictionary(entries):
+        jiji_dict = jiji.Dictionary('Benchmark', 'Japanese', 'English')
+        for entry in entries:
+            jiji_dict.add_entry(entry)
+        return jiji_dict
+
+    print(f'[{size}] parse_jmdict')
+    results['parse_jmdict'] = measure(lambda: f'{directory}/JMdict_e.gz',
+                                      lambda jmdict: list(process_jmdict.read_dictionary(jmdict)),
+                                      repeat, trace_memory)
+
+    # Each benchmark gets a fresh copy of the parsed entries, since tagging modifies them
+    entries_data = pickle.dumps(list(process_jmdict.read_dictionary(f'{directory}/JMdict_e.gz')),
+                                protocol=pickle.HIGHEST_PROTOCOL)
+
+    print(f'[{size}] add_entry')
+    results['add_entry'] = measure(lambda: pickle.loads(entries_data), new_dictionary, repeat, trace_memory)
+
+    tags_directory = f'{directory}/jmdict_tags'
+    if not os.path.exists(tags_directory):
+        lemmas = sorted({l for e in pickle.loads(entries_data) for l in e.lemmas + e.pronunciations})
+        synthetic_data.generate_tag_files(tags_directory, lemmas, seed)
+
+    print(f'[{size}] tag_dictionary')
+    results['tag_dictionary'] = measure(
+        lambda: new_dictionary(pickle.loads(entries_data)),
+        lambda jiji_dict: jiji.tag_dictionary_files(jiji_dict, tags_directory, process_jmdict.TAGS_FILES_OPTS),
+        repeat, trace_memory)
+
+    jiji_dict = new_dictionary(pickle.loads(entries_data))
+    jiji.tag_dictionary_files(jiji_dict, tags_directory, process_jmdict.TAGS_FILES_OPTS)
+    dictionary_path = f'{directory}/dictionary.jiji.yaml'
+
+    print(f'[{size}] save')
+    results['save'] = measure(lambda: jiji_dict, lambda d: d.save(dictionary_path), repeat, trace_memory)
+
+    print(f'[{size}] load')
+    results['load'] = measure(lambda: dictionary_path, jiji.Dictionary.load, repeat, trace_memory)
+
+    rng = random.Random(seed)
+    keys = list(jiji_dict.entries_by_lemma) + list(jiji_dict.entries_by_pronunciation)
+    lookups = [rng.choice(keys) for _ in range(NB_LOOKUPS)]
+    prefixes = [k[:rng.randint(1, len(k))] for k in lookups]
+
+    def get_entries(lemmas):
+        for lemma in lemmas:
+            jiji_dict.get_entries_by_key(lemma)
+
+    def search_prefixes(prefixes):
+        for prefix in prefixes:
+            jiji_dict.search_prefix(prefix, limit=10)
+
+    def get_normalized_entries(queries):
+        for query in queries:
+            kana_index.get_entries(query)
+
+    print(f'[{size}] lookups')
+    results['get_entries_by_key'] = measure(lambda: lookups, get_entries, repeat, trace_memory)
+    jiji_dict.get_sorted_keys()
+    results['search_prefix'] = measure(lambda: prefixes, search_prefixes, repeat, trace_memory)
+
+    def build_kana_index(kana_index):
+        for entry in jiji_dict.entries:
+            kana_index.add_entry(entry)
+
+    results['kana_index'] = measure(KanaIndex, build_kana_index, repeat, trace_memory)
+    kana_index = KanaIndex()
+    build_kana_index(kana_index)
+    results['kana_index_lookup'] = measure(lambda: lookups, get_normalized_entries, repeat, trace_memory)
+    for name in ('get_entries_by_key', 'search_prefix', 'kana_index_lookup'):
+        results[name]['nb_operations'] = NB_LOOKUPS
+
+    print(f'[{size}] frequency lists builders')
+    results['process_bccwj'] = measure_script(BCCWJ_BUILDER_PATH, f'{directory}/japanese/wordsfrequency')
+    results['process_lexique'] = measure_script(LEXIQUE_BUILDER_PATH, f'{directory}/french/wordsfrequency')
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare results to a baseline, print the ratios and return the regressions as (size, name, metric, ratio)"""
+    regressions = []
+    for size, benchmarks in results['sizes'].items():
+        if size not in baseline['sizes']:
+            print(f'No baseline for size {size}.')
+            continue
+        print(f'Size {size}, ratio to the baseline(>1 is slower or bigger):')
+        for name, measures in benchmarks.items():
+            baseline_measures = baseline['sizes'][size].get(name, {})
+            ratios = []
+            for metric in ('seconds', 'peak_memory_bytes', 'max_rss_bytes'):
+                if not measures.get(metric) or not baseline_measures.get(metric):
+                    continue
+                ratio = measures[metric] / baseline_measures[metric]
+                ratios.append(f'{metric} {ratio:.2f}')
+                if ratio > 1 + tolerance:
+                    regressions.append((size, name, metric, ratio))
+            print(f'  {name:<20} ' + ', '.join(ratios))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the jiji dictionaries operations and builders')
+    parser.add_argument('--size', type=int, action='append', help=f'number of entries, default {DEFAULT_SIZES}')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='number of timed runs, the best is kept')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure the peak memory with tracemalloc')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='JSON results to compare to')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'sizes': {},
+    }
+    for size in args.size or DEFAULT_SIZES:
+        results['sizes'][str(size)] = run_benchmarks(size, args.seed, args.repeat, not args.no_memory)
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as out:
+            json.dump(results, out, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(json.dumps(results, indent=2))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('seed') != args.seed:
+        print(f'Warning: the baseline was generated with seed {baseline.get("seed")}.')
+    regressions = compare(results, baseline, args.tolerance)
+    for size, name, metric, ratio in regressions:
+        print(f'Regression: {name} {metric} is {ratio:.2f}x the baseline for size {size}.')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
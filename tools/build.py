@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import importlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from tools.build_metrics import BuildMetrics
+from tools.download import CACHE_DIRECTORY
+
+"""
+Build everything the builders produce(tag files, dictionaries, inflection tables) with a single command
+Each builder script declares its stages with a get_stages function: functions of the builder taking a
+BuildMetrics, with the files they read(inputs) and write(outputs). A stage depends on the stages writing
+its inputs, so the frequency lists are written before the dictionaries are tagged with them and downloads
+are done before the downloaded files are parsed. The stages whose dependencies are done run at the same time,
+whatever their language, in a pool of NB_PROCESSES processes.
+Like make, a stage is skipped when all its outputs are newer than its inputs and its builder script. Stages
+without inputs(downloads) always run, they check for updates themselves. Stages reading source files that are
+not in the repository(ex: the BCCWJ frequency list) are skipped when these files are missing, their outputs are
+then used as they are.
+"""
+
+USAGE = """Usage, with the languages to build, all by default:
+    python -m tools.build
+    python -m tools.build japanese french"""
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# Builders scripts, relative to the repository root, the language of a builder is its first directory
+BUILDERS = [
+    'builders/japanese/wordsfrequency/process_bccwj.py',
+    'builders/japanese/english-jmdict/process_jmdict.py',
+    'builders/french/wordsfrequency/process_lexique.py',
+]
+NB_PROCESSES = os.cpu_count()
+# Metrics of the stages run, see tools/build_metrics.py
+REPORTS_DIRECTORY = f'{ROOT_DIRECTORY}/tools/{CACHE_DIRECTORY}/builds/reports'
+
+
+class BuildStage:
+    """Function of a builder, with the files it reads and writes"""
+
+    def __init__(self, name, function, inputs=(), outputs=(), optional_outputs=()):
+        """optional_outputs are outputs that are not written when they would be empty(ex: the freqNN.txt files
+        of frequency levels without lemmas), the stage is up to date without them"""
+        self.name = name
+        self.function = function
+        self.inputs = [os.path.abspath(f) for f in inputs]
+        self.outputs = [os.path.abspath(f) for f in outputs]
+        self.optional_outputs = [os.path.abspath(f) for f in optional_outputs]
+        self.outputs += [f for f in self.optional_outputs if f not in self.outputs]
+        # Set by get_stages
+        self.builder = None
+        self.depends_on = set()
+
+
+def get_builder_language(builder):
+    return builder.split('/')[1]
+
+
+def load_builder(builder):
+    """Import a builder script, the builders directories are not packages so the script directory is added
+    to sys.path: the functions of the builder can then be pickled by the process pools of the builder too"""
+    directory, filename = os.path.split(os.path.join(ROOT_DIRECTORY, builder))
+    if directory not in sys.path:
+        sys.path.append(directory)
+    return importlib.import_module(os.path.splitext(filename)[0])
+
+
+def get_stages(builders):
+    """Return the stages of the builders by name(<builder script>.<stage>), with the names of the stages
+    they depend on. Raise a RuntimeError if a file is written by several stages."""
+    stages = {}
+    for builder in builders:
+        module = load_builder(builder)
+        for stage in module.get_stages():
+            stage.name = f'{os.path.splitext(os.path.basename(builder))[0]}.{stage.name}'
+            stage.builder = builder
+            stages[stage.name] = stage
+
+    stage_by_output = {}
+    for stage in stages.values():
+        for output in stage.outputs:
+            if output in stage_by_output:
+                raise RuntimeError(f"{output} is written by both {stage_by_output[output]} and {stage.name}")
+            stage_by_output[output] = stage.name
+    for stage in stages.values():
+        stage.depends_on = {stage_by_output[f] for f in stage.inputs if f in stage_by_output} - {stage.name}
+    return stages
+
+
+def has_outputs(stage):
+    """Whether the outputs of the stage exist, optional ones may be missing but not all of them"""
+    outputs = [o for o in stage.outputs if os.path.exists(o)]
+    return bool(outputs) and all(o in outputs for o in stage.outputs if o not in stage.optional_outputs)
+
+
+def is_up_to_date(stage):
+    """Whether the outputs of the stage exist, see has_outputs, and are newer than its inputs and builder script"""
+    if not stage.inputs or not has_outputs(stage):
+        return False
+    inputs = stage.inputs + [os.path.join(ROOT_DIRECTORY, stage.builder)]
+    oldest_output = min(os.path.getmtime(o) for o in stage.outputs if os.path.exists(o))
+    return all(os.path.getmtime(f) <= oldest_output for f in inputs if os.path.exists(f))
+
+
+def run_stage(builder, function_name, stage_name):
+    """Run a stage in a worker process, write the report of its metrics and return it as text"""
+    metrics = BuildMetrics(stage_name)
+    getattr(load_builder(builder), function_name)(metrics)
+    metrics.write_report(f'{REPORTS_DIRECTORY}/{stage_name}.json')
+    return metrics.format_report()
+
+
+def build(builders=BUILDERS, nb_processes=NB_PROCESSES):
+    """Run the stages of the builders that are not up to date, in dependency order and in nb_processes processes
+    Return the status of each stage: run, up to date, missing inputs, failed or
+    not run(one of the stages it depends on failed or had missing inputs and no outputs)."""
+    stages = get_stages(builders)
+    status = {}
+    pending = dict(stages)
+    running = {}
+    with ProcessPoolExecutor(nb_processes) as executor:
+        while pending or running:
+            nb_pending = len(pending)
+            for name, stage in list(pending.items()):
+                if any(status.get(d) in ('failed', 'not run') for d in stage.depends_on):
+                    print(f'Stage {name} is not run, a stage it depends on failed or was not run.')
+                    status[name] = 'not run'
+                    del pending[name]
+                    continue
+                if not stage.depends_on.issubset(status):
+                    continue
+                del pending[name]
+                # Inputs written by no stage are source files, they may be missing from the repository
+                missing = [f for f in stage.inputs if not os.path.exists(f)]
+                if missing:
+                    kept = has_outputs(stage)
+                    print(f"Stage {name} has missing inputs({', '.join(missing)})"
+                          f"{', its outputs are kept' if kept else ''}.")
+                    status[name] = 'missing inputs' if kept else 'not run'
+                elif is_up_to_date(stage):
+                    print(f'Stage {name} is up to date.')
+                    status[name] = 'up to date'
+                else:
+                    print(f'Run stage {name}.')
+                    future = executor.submit(run_stage, stage.builder, stage.function.__name__, name)
+                    running[future] = (name, time.perf_counter())
+            if not running:
+                if pending and len(pending) == nb_pending:
+                    raise RuntimeError(f"Stages {', '.join(pending)} depend on each other")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, start = running.pop(future)
+                try:
+                    report = future.result()
+                except Exception as e:
+                    print(f'Stage {name} failed after {time.perf_counter() - start:.1f}s: {e!r}')
+                    status[name] = 'failed'
+                else:
+                    print(report)
+                    status[name] = 'run'
+                    # Outputs left as they were by the build cache of the stage are up to date too,
+                    # stages without inputs(downloads) only update their outputs when they changed
+                    for output in stages[name].outputs if stages[name].inputs else ():
+                        if os.path.exists(output):
+                            os.utime(output)
+    return status
+
+
+if __name__ == '__main__':
+    languages = set(sys.argv[1:])
+    builders = [b for b in BUILDERS if not languages or get_builder_language(b) in languages]
+    if not builders:
+        print(USAGE)
+        sys.exit(1)
+    build_status = build(builders)
+    for stage_name, stage_status in build_status.items():
+        print(f'  {stage_name:<40} {stage_status}')
+    sys.exit(1 if 'failed' in build_status.values() else 0)
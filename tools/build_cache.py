@@ -0,0 +1,95 @@
+import os
+import json
+import pickle
+import hashlib
+
+from tools.download import CACHE_DIRECTORY
+
+"""
+Content hashed cache for the stages of the builders(parse, tag, emit...)
+Each stage has a key computed from the content of its input files, the keys of the stages
+it depends on and its parameters, so the key of every stage is known before running anything.
+A stage is only run again when its key changed, otherwise its result is loaded from the cache,
+or for stages writing files, skipped entirely if its output files are unchanged.
+Only the last result of each stage is kept, along with a manifest of its inputs and outputs.
+"""
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class BuildCache:
+    """Cache of the stages results of one builder"""
+
+    def __init__(self, name):
+        curr_dir = os.path.dirname(os.path.realpath(__file__))
+        self.directory = f'{curr_dir}/{CACHE_DIRECTORY}/builds/{name}'
+        self.manifest_path = f'{self.directory}/manifest.json'
+        self.manifest = {'stages': {}, 'file_hashes': {}}
+        self.stages_inputs = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+
+    def save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.manifest_path + '.tmp', 'w') as out:
+            json.dump(self.manifest, out, indent=2, ensure_ascii=False)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    def file_hash(self, filepath):
+        """Hash of the content of a file, only computed again when its size or modification time changed"""
+        filepath = os.path.abspath(filepath)
+        file_stat = os.stat(filepath)
+        cached = self.manifest['file_hashes'].get(filepath)
+        if cached and cached[:2] == [file_stat.st_size, file_stat.st_mtime_ns]:
+            return cached[2]
+        file_hash = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                file_hash.update(block)
+        self.manifest['file_hashes'][filepath] = [file_stat.st_size, file_stat.st_mtime_ns, file_hash.hexdigest()]
+        return file_hash.hexdigest()
+
+    def stage_key(self, stage, input_files=(), depends_on=(), params=None):
+        """Compute the key of a stage from the content of its input files, the keys of
+        the stages it depends on and its parameters(anything that can be written in JSON)"""
+        inputs = {os.path.abspath(f): self.file_hash(f) for f in input_files}
+        self.stages_inputs[stage] = {'files': inputs, 'depends_on': list(depends_on), 'params': params}
+        key = hashlib.sha256(json.dumps([stage, sorted(inputs.items()), list(depends_on), params]).encode())
+        return key.hexdigest()
+
+    def is_up_to_date(self, stage, key, outputs=()):
+        """Check if a stage was already run with this key and its output files were not modified since"""
+        recorded = self.manifest['stages'].get(stage)
+        if not recorded or recorded['key'] != key:
+            return False
+        return all(os.path.exists(o) and self.file_hash(o) == recorded['outputs'].get(os.path.abspath(o))
+                   for o in outputs)
+
+    def run_stage(self, stage, key, function, outputs=()):
+        """Return the result of function for this stage, loaded from the cache if the stage key did not change
+        For stages writing files, the function is not run if its output files are up to date and None is returned"""
+        result_path = f'{self.directory}/{stage}.pickle'
+        if self.is_up_to_date(stage, key, outputs):
+            if outputs:
+                print(f'Stage {stage} is up to date.')
+                return None
+            if os.path.exists(result_path):
+                print(f'Stage {stage} is up to date, load its result from the cache.')
+                with open(result_path, 'rb') as f:
+                    return pickle.load(f)
+
+        print(f'Run stage {stage}.')
+        result = function()
+        os.makedirs(self.directory, exist_ok=True)
+        if not outputs:
+            with open(result_path + '.tmp', 'wb') as out:
+                pickle.dump(result, out, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(result_path + '.tmp', result_path)
+        self.manifest['stages'][stage] = {
+            'key': key,
+            'inputs': self.stages_inputs.get(stage, {}),
+            'outputs': {os.path.abspath(o): self.file_hash(o) for o in outputs},
+        }
+        self.save_manifest()
+        return result
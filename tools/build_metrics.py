@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import resource
+import tracemalloc
+from contextlib import contextmanager
+
+"""
+Metrics of the stages of a build(download, parse, tag, save...): wall time, CPU time, peak memory,
+and counters like the number of entries parsed or the lemmas missing for each tag file.
+    metrics = BuildMetrics('jmdict_english')
+    with metrics.stage('parse'):
+        ...
+        metrics.count('entries_parsed')
+    metrics.write_report('report.json')
+    print(metrics.format_report())
+CPU time includes the worker processes that finished during the stage. The highest resident memory of the
+process and its finished workers can only be read since the process started(ru_maxrss): it is reported for
+the whole build, and each stage reports how much it raised it, 0 for stages using less memory than an
+earlier stage. The peak memory allocated by Python during each stage is also measured with tracemalloc
+when JIJI_TRACE_MEMORY is set, but this makes the build much slower.
+When JIJI_PROFILE is set to a directory, each stage is run under cProfile and its stats are written
+to <directory>/<build name>.<stage>.prof, to read with python -m pstats.
+Stages must not be nested.
+"""
+
+PROFILE_ENV_VARIABLE = 'JIJI_PROFILE'
+TRACE_MEMORY_ENV_VARIABLE = 'JIJI_TRACE_MEMORY'
+# ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+MAX_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def get_max_rss():
+    """Peak resident memory in bytes of this process and of its finished child processes"""
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * MAX_RSS_UNIT
+
+
+def get_cpu_time():
+    """CPU time of this process and of its finished child processes"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class BuildMetrics:
+    """Time, memory and counters of the stages of one build"""
+
+    def __init__(self, name, profile_directory=None, trace_memory=None):
+        self.name = name
+        self.profile_directory = profile_directory or os.environ.get(PROFILE_ENV_VARIABLE)
+        self.trace_memory = bool(os.environ.get(TRACE_MEMORY_ENV_VARIABLE)) if trace_memory is None else trace_memory
+        self.stages = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, stage):
+        """Measure the code run in the with block as a stage of the build"""
+        if self.trace_memory:
+            tracemalloc.start()
+        profiler = cProfile.Profile() if self.profile_directory else None
+        start, start_cpu, start_max_rss = time.perf_counter(), get_cpu_time(), get_max_rss()
+        if profiler:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler:
+                profiler.disable()
+            metrics = {
+                'wall_seconds': time.perf_counter() - start,
+                'cpu_seconds': get_cpu_time() - start_cpu,
+                'max_rss_increase_bytes': get_max_rss() - start_max_rss,
+            }
+            if self.trace_memory:
+                metrics['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if profiler:
+                os.makedirs(self.profile_directory, exist_ok=True)
+                metrics['profile'] = os.path.join(self.profile_directory, f'{self.name}.{stage}.prof')
+                profiler.dump_stats(metrics['profile'])
+            self.stages[stage] = metrics
+
+    def count(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def report(self):
+        return {
+            'build': self.name,
+            'wall_seconds': time.perf_counter() - self.start,
+            'max_rss_bytes': get_max_rss(),
+            'stages': self.stages,
+            'counters': self.counters,
+        }
+
+    def write_report(self, filename):
+        """Write the report in JSON"""
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        with open(filename, 'w') as out:
+            json.dump(self.report(), out, indent=2)
+
+    def format_report(self):
+        """Report as text, one line per stage and per counter"""
+        report = self.report()
+        lines = [f"Build {self.name} in {report['wall_seconds']:.1f}s, peak memory {report['max_rss_bytes'] / 2 ** 20:.0f}MB"]
+        for stage, metrics in self.stages.items():
+            line = (f"  {stage:<12} {metrics['wall_seconds']:8.2f}s wall {metrics['cpu_seconds']:8.2f}s CPU"
+                    f" {metrics['max_rss_increase_bytes'] / 2 ** 20:8.0f}MB peak increase")
+            if 'peak_traced_bytes' in metrics:
+                line += f" {metrics['peak_traced_bytes'] / 2 ** 20:8.0f}MB allocated"
+            lines.append(line)
+        for counter, value in self.counters.items():
+            lines.append(f'  {counter:<40} {value}')
+        return '\n'.join(lines)
@@ -0,0 +1,108 @@
+import bisect
+import io
+import sys
+from collections import OrderedDict
+
+import yaml
+
+import jiji
+
+"""
+Random access to the entries of block compressed jiji dictionaries, saved with a filename ending with .gz
+The file is a gzip file whose first member holds the about information and, in its extra field, the table of the
+chunks of entries that follow, each compressed as its own gzip member, see jiji.write_compressed_dictionary_file.
+Looking up an entry decompresses only the chunk holding it, the last chunks read are kept parsed in memory:
+    jiji_dict.save('dictionary.jiji.yaml.gz')
+    with CompressedDictionary('dictionary.jiji.yaml.gz') as compressed:
+        compressed.get_entry('chat')
+
+The whole file is still read by gunzip, or by Dictionary.load, as a usual jiji YAML file.
+"""
+
+USAGE = """Usage:
+    python -m tools.compressed_dictionary dictionary.jiji.yaml.gz key..."""
+
+# Number of parsed chunks kept in memory
+CACHED_CHUNKS = 8
+
+
+class CompressedDictionary:
+    """Entries of a block compressed jiji YAML file, read chunk by chunk"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = open(filename, 'rb')
+        table = jiji.read_compressed_table(self.f)
+        if table is None:
+            self.f.close()
+            raise RuntimeError(f"{filename} is not a block compressed dictionary")
+        (self.version, self.is_sorted, self.nb_entries), about, self.chunks = table
+        self.about = (yaml.safe_load(about) or {}).get(jiji.Dictionary.ABOUT_DICT_KEY, {})
+        self.first_keys = [key for _, _, key in self.chunks]
+        # Entries by key of the last chunks read, the most recent last
+        self.cache = OrderedDict()
+
+    def __len__(self):
+        return self.nb_entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.f.close()
+
+    def read_chunk(self, i):
+        """Return the properties by key of the entries of the i-th chunk, as read in the YAML file"""
+        if i in self.cache:
+            self.cache.move_to_end(i)
+            return self.cache[i]
+        offset, size, _ = self.chunks[i]
+        self.f.seek(offset)
+        text = jiji.decompress_members(self.f.read(size))
+        # Entries are only created when they are looked up
+        items = {}
+        for lines in jiji.iter_dictionary_blocks(io.StringIO(text)):
+            if lines is None:
+                # The first line of the chunk is not a key line of the simple jiji format(ex: a key starting
+                # with ':'), the whole chunk is loaded by PyYAML at once
+                items = {str(k): v for k, v in (yaml.safe_load(text) or {}).items()}
+                break
+            for key, properties in jiji.parse_entry_lines(lines):
+                items[str(key)] = properties
+        self.cache[i] = items
+        if len(self.cache) > CACHED_CHUNKS:
+            self.cache.popitem(last=False)
+        return items
+
+    def get_entry(self, key):
+        """Return the entry with key(its lemmas separated by ', ') or None. Only the chunk that may hold it
+        is read, files whose entries are not sorted are read chunk by chunk until the entry is found."""
+        if self.is_sorted:
+            i = bisect.bisect_right(self.first_keys, key) - 1
+            chunks = [i] if i >= 0 else []
+        else:
+            chunks = range(len(self.chunks))
+        for i in chunks:
+            items = self.read_chunk(i)
+            if key in items:
+                return jiji.Entry.from_dict(key, items[key])
+        return None
+
+    def iter_entries(self):
+        """Yield all the entries, in the order of the file"""
+        for i in range(len(self.chunks)):
+            for key, properties in self.read_chunk(i).items():
+                yield jiji.Entry.from_dict(key, properties)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(USAGE)
+        sys.exit(1)
+    with CompressedDictionary(sys.argv[1]) as compressed:
+        for key in sys.argv[2:]:
+            entry = compressed.get_entry(key)
+            print(key, entry.senses if entry else 'not found')
@@ -0,0 +1,163 @@
+import os
+import sys
+import heapq
+import pickle
+import itertools
+import tempfile
+from operator import itemgetter
+
+import jiji
+
+"""
+Streaming merge and diff of jiji dictionary files sorted by entry key
+The files are read one entry at a time, see jiji.iter_entries, and combined in a single linear pass
+so memory usage does not depend on the size of the dictionaries. Dictionaries are written sorted with
+    jiji_dict.save(filename, sort_keys=True)
+and existing files can be sorted with sort_dictionary_file, which only keeps SORT_CHUNK_SIZE entries in memory.
+"""
+
+USAGE = """Usage:
+    python -m tools.dictionary_merge merge output.yaml jmdict.yaml additions.yaml
+    python -m tools.dictionary_merge diff previous.yaml new.yaml
+    python -m tools.dictionary_merge sort input.yaml output.yaml"""
+
+# Number of entries sorted in memory at once by sort_dictionary_file
+SORT_CHUNK_SIZE = 100000
+
+
+def read_about(filename):
+    """Return a dictionary without entries, with the title, licence and languages of a dictionary file"""
+    dictionary = jiji.Dictionary(title='', lang_from='')
+    for key, value in jiji.iter_dictionary_items(filename):
+        if key == jiji.Dictionary.ABOUT_DICT_KEY and isinstance(value, dict):
+            dictionary.set_about(value)
+        break
+    return dictionary
+
+
+def iter_sorted_entries(filename):
+    """Yield the (key, entry) of a dictionary file sorted by key, entries with the same key are all yielded"""
+    previous_key = None
+    for entry in jiji.iter_entries(filename):
+        key = entry.get_entry_key()
+        if previous_key is not None and key < previous_key:
+            raise RuntimeError(f"{filename} is not sorted by key({key} after {previous_key}), sort it with sort_dictionary_file")
+        previous_key = key
+        yield key, entry
+
+
+def iter_runs(run_filename):
+    with open(run_filename, 'rb') as f:
+        while True:
+            try:
+                yield from pickle.load(f)
+            except EOFError:
+                return
+
+
+def sort_dictionary_file(source, destination, chunk_size=SORT_CHUNK_SIZE):
+    """Write the entries of a dictionary file sorted by key, with an external merge sort:
+    chunks of entries are sorted in memory and written to temporary files, which are then merged.
+    Like when a dictionary is loaded then saved, the last entry of a key wins."""
+    with tempfile.TemporaryDirectory() as tmp_directory:
+        runs = []
+        entries = ((e.get_entry_key(), e) for e in jiji.iter_entries(source))
+        while True:
+            chunk = list(itertools.islice(entries, chunk_size))
+            if not chunk:
+                break
+            chunk.sort(key=itemgetter(0))
+            runs.append(os.path.join(tmp_directory, f'run{len(runs)}.pickle'))
+            with open(runs[-1], 'wb') as out:
+                # Pickled by batches so that reading a run back does not load it all
+                for start in range(0, len(chunk), jiji.SAVE_CHUNK_SIZE):
+                    pickle.dump(chunk[start:start + jiji.SAVE_CHUNK_SIZE], out, protocol=pickle.HIGHEST_PROTOCOL)
+            del chunk
+
+        # heapq.merge is stable so the entries of a key stay in the file order
+        merged = heapq.merge(*[iter_runs(r) for r in runs], key=itemgetter(0))
+        last_by_key = ((key, list(group)[-1][1]) for key, group in itertools.groupby(merged, key=itemgetter(0)))
+        return jiji.write_dictionary_file(destination, read_about(source).dump_about(), last_by_key)
+
+
+def merge_entries(entries):
+    """Combine entries with the same key: senses, pronunciations and tags of all the entries, in order"""
+    merged = jiji.Entry(entries[0].entry_id)
+    for l in entries[0].lemmas:
+        merged.add_lemma(l)
+    for e in entries:
+        for s in e.senses:
+            if s not in merged.senses:
+                merged.senses.append(s)
+        for p in e.pronunciations:
+            merged.add_pronunciation(p)
+        for t in e.tags:
+            merged.add_tag(t)
+    return merged
+
+
+def merge_dictionary_files(filenames, destination, about=None):
+    """Merge dictionary files sorted by key into one sorted file, entries with the same key are combined,
+    see merge_entries. The about information is the one of the first file unless about is given
+    as a Dictionary. Return the number of entries written."""
+    streams = [iter_sorted_entries(f) for f in filenames]
+    merged = heapq.merge(*streams, key=itemgetter(0))
+    entries = ((key, merge_entries([e for _, e in group]))
+               for key, group in itertools.groupby(merged, key=itemgetter(0)))
+    return jiji.write_dictionary_file(destination, (about or read_about(filenames[0])).dump_about(), entries)
+
+
+def iter_unique_entries(filename):
+    """Like iter_sorted_entries, but only the last entry of each key, as when the file is loaded"""
+    for key, group in itertools.groupby(iter_sorted_entries(filename), key=itemgetter(0)):
+        yield key, list(group)[-1][1]
+
+
+def diff_dictionary_files(old_filename, new_filename):
+    """Compare two dictionary files sorted by key, yield ('added', key, None, entry),
+    ('removed', key, entry, None) or ('changed', key, old_entry, new_entry) in key order"""
+    old_entries = iter_unique_entries(old_filename)
+    new_entries = iter_unique_entries(new_filename)
+    old, new = next(old_entries, None), next(new_entries, None)
+    while old or new:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield 'removed', old[0], old[1], None
+            old = next(old_entries, None)
+        elif old is None or new[0] < old[0]:
+            yield 'added', new[0], None, new[1]
+            new = next(new_entries, None)
+        else:
+            if old[1].to_ordered_dict() != new[1].to_ordered_dict():
+                yield 'changed', old[0], old[1], new[1]
+            old, new = next(old_entries, None), next(new_entries, None)
+
+
+def format_diff(diff):
+    """Changelog lines of a diff: + for added entries, - for removed ones and ~ for changed ones,
+    followed by the properties that changed"""
+    for status, key, old_entry, new_entry in diff:
+        if status == 'added':
+            yield f'+ {key}'
+        elif status == 'removed':
+            yield f'- {key}'
+        else:
+            yield f'~ {key}'
+            for attribute in ('senses', 'pronunciations', 'tags'):
+                old_values, new_values = getattr(old_entry, attribute), getattr(new_entry, attribute)
+                if old_values != new_values:
+                    removed = [v for v in old_values if v not in new_values]
+                    added = [v for v in new_values if v not in old_values]
+                    yield f'    {attribute}: ' + ', '.join([f'-{v}' for v in removed] + [f'+{v}' for v in added] or ['reordered'])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 4 and sys.argv[1] == 'merge':
+        print(f'{merge_dictionary_files(sys.argv[3:], sys.argv[2])} entries written to {sys.argv[2]}')
+    elif len(sys.argv) == 4 and sys.argv[1] == 'diff':
+        for line in format_diff(diff_dictionary_files(sys.argv[2], sys.argv[3])):
+            print(line)
+    elif len(sys.argv) == 4 and sys.argv[1] == 'sort':
+        print(f'{sort_dictionary_file(sys.argv[2], sys.argv[3])} entries written to {sys.argv[3]}')
+    else:
+        print(USAGE)
+        sys.exit(1)
@@ -1,51 +1,185 @@
 import os
+import json
 import time
 import hashlib
 import gzip
 import shutil
-from subprocess import run
-from itertools import chain
+import ftplib
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 
 CACHE_DIRECTORY = "downloads_cache"
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_RETRIES = 3
+NB_CONCURRENT_DOWNLOADS = 4
+# FTP files are downloaded again when their modification time(MDTM) or size changed, files of other
+# protocols, or of FTP servers without these commands, are only checked for update once a day
+CHECK_FOR_UPDATE_INTERVAL = 60 * 60 * 24
 
 
 def decompress_gzip_file(filepath):
     decompressed = filepath + ".decompressed"
-    if not os.path.exists(decompressed):
+    if not os.path.exists(decompressed) or os.path.getmtime(decompressed) < os.path.getmtime(filepath):
         with gzip.open(filepath, 'rb') as f_in:
             with open(decompressed, 'wb') as f_out:
                 shutil.copyfileobj(f_in, f_out)
     return decompressed
 
 
-def download_if_modified(url):
-    """Download a file only if is has been modified via curl, see https://superuser.com/a/1159510"""
+def get_cache_filename(url):
     url_hash = hashlib.md5(url.encode()).hexdigest()
     curr_dir = os.path.dirname(os.path.realpath(__file__))
-    filename = f'{curr_dir}/{CACHE_DIRECTORY}/{url_hash}'
-    print(f'Download {url} if it has been modified, destination is {filename}')
+    os.makedirs(f'{curr_dir}/{CACHE_DIRECTORY}', exist_ok=True)
+    return f'{curr_dir}/{CACHE_DIRECTORY}/{url_hash}'
+
+
+def read_metadata(filename):
+    """Read the HTTP validators(ETag, Last-Modified) saved along a downloaded file"""
+    if not os.path.exists(filename + '.meta'):
+        return {}
+    with open(filename + '.meta') as f:
+        return json.load(f)
+
+
+def write_metadata(filename, metadata):
+    with open(filename + '.meta', 'w') as out:
+        json.dump(metadata, out)
 
-    # If file exists and was modified today do not check for update
-    check_for_update = True
-    if os.path.exists(filename):
-        file_stat = os.stat(filename)
-        file_age_seconds = (time.time() - file_stat.st_mtime)
-        if file_age_seconds < 60 * 60 * 24:
-            check_for_update = False
-            print('File on disk is less than a day old, do not check for update.')
 
-    if check_for_update:
-        run(chain(
-            ('curl', '-s', url),
-            ('-o', filename),
-            ('-z', filename) if os.path.exists(filename) else (),
-        ))
+def download_if_modified(url, decompress=True):
+    """Download a file only if is has been modified since the last download
+    For HTTP the request is conditional(If-None-Match/If-Modified-Since), interrupted downloads
+    are resumed with a Range request. FTP files are compared with their modification time and size
+    on the server, other protocols are checked for update once a day.
+    gzip files are decompressed on disk unless decompress is False, in which case
+    the path of the compressed file is returned so it can be streamed with gzip.open
+    """
+    filename = get_cache_filename(url)
+    print(f'Download {url} if it has been modified, destination is {filename}')
+
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        try:
+            if url.startswith(('http://', 'https://')):
+                download_http(url, filename)
+            else:
+                download_other(url, filename)
+            break
+        except (urllib.error.URLError, http.client.HTTPException, ftplib.error_temp, ConnectionError, TimeoutError) as e:
+            if isinstance(e, urllib.error.HTTPError) or attempt == DOWNLOAD_RETRIES:
+                raise
+            print(f'Download of {url} failed({e}), retry {attempt}/{DOWNLOAD_RETRIES - 1}.')
 
     filepath = os.path.abspath(filename)
 
     # Auto decompress gzip files
-    if url.endswith('.gz'):
+    if decompress and url.endswith('.gz'):
         return decompress_gzip_file(filepath)
 
     return filepath
+
+
+def download_http(url, filename):
+    """Conditional and resumable HTTP download of url to filename"""
+    headers = {}
+    if os.path.exists(filename):
+        metadata = read_metadata(filename)
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+    # Resume a previous partial download, If-Range makes the server send the
+    # whole file instead if it changed since the partial download started
+    partial = filename + '.part'
+    partial_metadata = read_metadata(partial)
+    partial_validator = partial_metadata.get('etag') or partial_metadata.get('last_modified')
+    if os.path.exists(partial) and partial_validator:
+        headers['Range'] = f'bytes={os.path.getsize(partial)}-'
+        headers['If-Range'] = partial_validator
+
+    try:
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=DOWNLOAD_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            print('File was not modified since last download.')
+            return
+        if e.code == 416 and 'Range' in headers:
+            # The partial download cannot be resumed, start over
+            os.remove(partial)
+            return download_http(url, filename)
+        raise
+
+    with response:
+        metadata = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        write_metadata(partial, metadata)
+        with open(partial, 'ab' if response.status == 206 else 'wb') as out:
+            shutil.copyfileobj(response, out, DOWNLOAD_BLOCK_SIZE)
+        if response.length:
+            # The connection was closed before the end, what was received is kept to resume
+            raise http.client.IncompleteRead(b'', response.length)
+    os.replace(partial, filename)
+    write_metadata(filename, metadata)
+    os.remove(partial + '.meta')
+
+
+def get_ftp_validators(url):
+    """Return the modification time(MDTM) and size(SIZE) of a file on an FTP server,
+    or None if the server does not support these commands"""
+    parts = urllib.parse.urlsplit(url)
+    path = urllib.parse.unquote(parts.path)
+    with ftplib.FTP(timeout=DOWNLOAD_TIMEOUT) as ftp:
+        ftp.connect(parts.hostname, parts.port or ftplib.FTP_PORT)
+        ftp.login(urllib.parse.unquote(parts.username or 'anonymous'), urllib.parse.unquote(parts.password or ''))
+        try:
+            modified = ftp.voidcmd(f'MDTM {path}').split()[-1]
+            ftp.voidcmd('TYPE I')
+            size = ftp.size(path)
+        except ftplib.error_perm:
+            return None
+    return {'modified': modified, 'size': size}
+
+
+def download_other(url, filename):
+    """Download url to filename if it changed on the FTP server, or for other protocols and FTP
+    servers that do not give the modification time of files, if the file on disk is more than a day old"""
+    validators = get_ftp_validators(url) if url.startswith('ftp://') else None
+    if os.path.exists(filename):
+        if validators is not None:
+            metadata = read_metadata(filename)
+            if all(metadata.get(name) == value for name, value in validators.items()):
+                print('File was not modified since last download.')
+                return
+        elif time.time() - os.stat(filename).st_mtime < CHECK_FOR_UPDATE_INTERVAL:
+            print('File on disk is less than a day old, do not check for update.')
+            return
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        with open(filename + '.part', 'wb') as out:
+            shutil.copyfileobj(response, out, DOWNLOAD_BLOCK_SIZE)
+    os.replace(filename + '.part', filename)
+    write_metadata(filename, {'url': url, **(validators or {})})
+
+
+def download_all(urls, decompress=True):
+    """Download several files concurrently, see download_if_modified, and return their paths"""
+    unique_urls = list(dict.fromkeys(urls))
+    with ThreadPoolExecutor(NB_CONCURRENT_DOWNLOADS) as executor:
+        paths = dict(zip(unique_urls, executor.map(lambda url: download_if_modified(url, decompress), unique_urls)))
+    return [paths[url] for url in urls]
+
+
+def open_download(url):
+    """Download a file if it has been modified and return a binary file object to stream
+    its content, gzip files are decompressed on the fly"""
+    filepath = download_if_modified(url, decompress=False)
+    if url.endswith('.gz'):
+        return gzip.open(filepath, 'rb')
+    return open(filepath, 'rb')
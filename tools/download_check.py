@@ -0,0 +1,114 @@
+import os
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tools import download
+
+"""
+Check of the HTTP downloads of tools/download.py against a local http.server stand-in
+It checks that a file that was not modified is not downloaded again(304 answer to If-None-Match),
+that an interrupted download is resumed(206 answer to a Range request with If-Range) and that
+gzip files are decompressed on the fly by open_download. Files downloaded by the check are removed.
+A RuntimeError is raised at the first failed check.
+
+    python -m tools.download_check
+"""
+
+CHECK_DATA = b''.join(f'line {i} of the downloaded file\n'.encode() for i in range(10000))
+CHECK_ETAG = '"jiji-check-1"'
+
+
+class CheckHandler(BaseHTTPRequestHandler):
+    """Serve CHECK_DATA as /data.txt and gzipped as /data.txt.gz, with an ETag and Range support"""
+    # Status of the answers sent, checked by the test
+    statuses = []
+
+    def do_GET(self):
+        if self.path not in ('/data.txt', '/data.txt.gz'):
+            self.send_error(404)
+            return
+        data = gzip.compress(CHECK_DATA, mtime=0) if self.path.endswith('.gz') else CHECK_DATA
+        if self.headers.get('If-None-Match') == CHECK_ETAG:
+            self.answer(304)
+            return
+        start = 0
+        if self.headers.get('Range') and self.headers.get('If-Range') == CHECK_ETAG:
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            self.answer(206, data[start:], {'Content-Range': f'bytes {start}-{len(data) - 1}/{len(data)}'})
+            return
+        self.answer(200, data)
+
+    def answer(self, status, body=b'', headers=None):
+        self.statuses.append(status)
+        self.send_response(status)
+        self.send_header('ETag', CHECK_ETAG)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def check(condition, message):
+    if not condition:
+        raise RuntimeError(f"Download check failed: {message}")
+
+
+def remove_download(url):
+    filename = download.get_cache_filename(url)
+    for path in (filename, filename + '.meta', filename + '.part', filename + '.part.meta'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_checks(base_url):
+    statuses = CheckHandler.statuses
+    url = base_url + '/data.txt'
+    remove_download(url)
+    try:
+        filepath = download.download_if_modified(url)
+        with open(filepath, 'rb') as f:
+            check(f.read() == CHECK_DATA, 'the downloaded file differs from the served one')
+        check(statuses[-1] == 200, f'first download answered {statuses[-1]}')
+
+        download.download_if_modified(url)
+        check(statuses[-1] == 304, f'download of a file not modified answered {statuses[-1]}, not 304')
+
+        # A download interrupted after half of the file, with the validator of the partial download
+        filename = download.get_cache_filename(url)
+        os.remove(filename)
+        with open(filename + '.part', 'wb') as out:
+            out.write(CHECK_DATA[:len(CHECK_DATA) // 2])
+        download.write_metadata(filename + '.part', {'url': url, 'etag': CHECK_ETAG, 'last_modified': None})
+        download.download_if_modified(url)
+        check(statuses[-1] == 206, f'resumed download answered {statuses[-1]}, not 206')
+        with open(filename, 'rb') as f:
+            check(f.read() == CHECK_DATA, 'the resumed file differs from the served one')
+        check(not os.path.exists(filename + '.part'), 'the partial download was not removed')
+    finally:
+        remove_download(url)
+
+    gz_url = base_url + '/data.txt.gz'
+    remove_download(gz_url)
+    try:
+        with download.open_download(gz_url) as f:
+            check(f.read() == CHECK_DATA, 'the gzip file was not decompressed to the served data')
+        check(not os.path.exists(download.get_cache_filename(gz_url) + '.decompressed'),
+              'the gzip file was decompressed on disk instead of on the fly')
+    finally:
+        remove_download(gz_url)
+    print(f'Download checks passed, answers: {statuses}')
+
+
+if __name__ == '__main__':
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CheckHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        run_checks(f'http://127.0.0.1:{server.server_address[1]}')
+    finally:
+        server.shutdown()
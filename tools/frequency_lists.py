@@ -0,0 +1,175 @@
+import os
+import re
+import csv
+import itertools
+from array import array
+from operator import add, itemgetter
+
+from tools.language_level import LANG_LEVEL_LIMITS, get_language_level
+
+"""
+Build the freqNN.txt tag files from a words frequency list, shared by the wordsfrequency builders
+The lemmas are grouped in 12 language levels according to their frequency ranking, see tools/language_level.py
+Each frequency list is described by its columns, read column by column and not row by row:
+    COLUMNS = {
+        # Index of the lemma column
+        'lemma': 2,
+        # Lemmas containing one of these characters are ignored(broken entries)
+        'skip_lemmas_containing': '■',
+        # Only keep the rows where this column is not 0, ex: Lexique rows of conjugated forms
+        'filter_column': 13,
+        # Either ranks in several corpora, as (rank column, column that must not be empty for the rank to be used),
+        # the level of a lemma is the median of its levels in each corpus...
+        'ranks': [(0, 0), (11, 12)],
+        # ...or frequencies with their weight, the lemmas are ranked by the weighted mean of their frequencies
+        'frequencies': [(6, 2), (7, 1)],
+        # Subtracted from the ranks to take into account the missing ranks from ignored stopwords
+        'stopword_rank_offset': 160,
+    }
+"""
+
+# Rank of the lemmas missing from a corpus
+RANK_LAST = 1000000
+# Language level of the very infrequent lemmas that are not written in tag files
+LANG_LEVEL_IGNORED = len(LANG_LEVEL_LIMITS)
+# Tag files written for the other levels, see write_frequency_tags
+FREQUENCY_TAG_FILES = [f'freq{lang_level:02}.txt' for lang_level in range(1, LANG_LEVEL_IGNORED)]
+
+
+def read_stopwords(filepath):
+    """Read the stopwords, one per line"""
+    with open(filepath, encoding='utf-8') as f:
+        return {l.strip() for l in f}
+
+
+def read_word_list(filepath):
+    """Read a list of words, one per line, ignoring empty lines and comments starting with #"""
+    with open(filepath, encoding='utf-8') as f:
+        return [w for w in (l.strip() for l in f) if w and not w.startswith('#')]
+
+
+def read_columns(tsv_filepath, columns):
+    """Read the given columns of a TSV file with a header row, return a tuple of values per column"""
+    with open(tsv_filepath, newline='', encoding='utf-8') as freq_file:
+        tsv_in = csv.reader(freq_file, delimiter='\t')
+        next(tsv_in)  # Skip headers row
+        # The first column is repeated so that itemgetter returns a tuple even for a single column
+        rows = list(map(itemgetter(*columns, columns[0]), tsv_in))
+    if not rows:
+        return [() for _ in columns]
+    return list(zip(*rows))[:len(columns)]
+
+
+def level_table(offset):
+    """Language level by rank, from rank 0 to the first rank of the last level, see levels_from_ranks"""
+    last_rank = LANG_LEVEL_LIMITS[-1] + offset + 1
+    return bytes(get_language_level(max(1, rank - offset)) for rank in range(last_rank + 1))
+
+
+def median_level(levels):
+    """Median of language levels, truncated to an integer like int(statistics.median(levels))"""
+    levels = sorted(levels)
+    middle = len(levels) // 2
+    if len(levels) % 2:
+        return levels[middle]
+    return (levels[middle - 1] + levels[middle]) // 2
+
+
+def levels_from_ranks(columns, rank_columns, offset):
+    """Language level of each row, median of the levels of the row in each corpus"""
+    table = level_table(offset)
+    last_rank = itertools.repeat(len(table) - 1)
+    levels_by_corpus = []
+    for rank_column, present_column in rank_columns:
+        ranks = array('l', [int(r) if p else RANK_LAST for r, p in zip(columns[rank_column], columns[present_column])])
+        # Ranks after the first rank of the last level all have the same level
+        levels_by_corpus.append(bytes(map(table.__getitem__, map(min, ranks, last_rank))))
+    if len(levels_by_corpus) == 1:
+        return levels_by_corpus[0]
+    return bytes(map(median_level, zip(*levels_by_corpus)))
+
+
+def levels_from_frequencies(columns, frequency_columns, offset):
+    """Language level of each row from the rank of the weighted mean of its frequencies, 0 for rows without frequency"""
+    nb_rows = len(next(iter(columns.values())))
+    weighted_sums = itertools.repeat(0.0, nb_rows)
+    total_weights = itertools.repeat(0, nb_rows)
+    for column, weight in frequency_columns:
+        frequencies = list(map(str.strip, columns[column]))
+        weighted_sums = map(add, weighted_sums, [weight * float(f) if f else 0.0 for f in frequencies])
+        total_weights = map(add, total_weights, [weight if f else 0 for f in frequencies])
+    weighted_sums, total_weights = list(weighted_sums), list(total_weights)
+
+    ranked = list(itertools.compress(range(nb_rows), total_weights))
+    means = {i: weighted_sums[i] / total_weights[i] for i in ranked}
+    ranked.sort(key=means.__getitem__, reverse=True)
+    table = level_table(offset)
+    levels = bytearray(nb_rows)
+    for rank, i in enumerate(ranked, 1):
+        levels[i] = table[min(rank, len(table) - 1)]
+    return levels
+
+
+def read_frequency_list(tsv_filepath, config, stopwords=()):
+    """Read a words frequency list described by config, see the module docstring,
+    and return the lemmas by language level. Stopwords are ignored."""
+    stopwords = set(stopwords)
+    rank_columns = config.get('ranks', [])
+    frequency_columns = config.get('frequencies', [])
+    if bool(rank_columns) == bool(frequency_columns):
+        raise RuntimeError(f"Frequency list config of {tsv_filepath} needs either ranks or frequencies columns")
+
+    # Values of the columns used by index, only for the rows that are ranked
+    lemma_column, filter_column = config['lemma'], config.get('filter_column')
+    used_columns = {lemma_column} | {c for c, _ in frequency_columns} | {c for r in rank_columns for c in r}
+    if filter_column is not None:
+        used_columns.add(filter_column)
+    used_columns = sorted(used_columns)
+    columns = dict(zip(used_columns, read_columns(tsv_filepath, used_columns)))
+
+    # Broken lemmas, stopwords and filtered out rows are not ranked
+    kept = [l not in stopwords for l in columns[lemma_column]]
+    if config.get('skip_lemmas_containing'):
+        skip_regex = re.compile(f"[{re.escape(config['skip_lemmas_containing'])}]")
+        kept = [k and not skip_regex.search(l) for k, l in zip(kept, columns[lemma_column])]
+    if filter_column is not None:
+        kept = [k and bool(int(f)) for k, f in zip(kept, columns[filter_column])]
+    for column, values in columns.items():
+        columns[column] = list(itertools.compress(values, kept))
+
+    offset = config.get('stopword_rank_offset', 0)
+    if rank_columns:
+        levels = levels_from_ranks(columns, rank_columns, offset)
+    else:
+        levels = levels_from_frequencies(columns, frequency_columns, offset)
+
+    lemmas_by_lang_level = {}
+    for lemma, level in zip(columns[lemma_column], levels):
+        if level:
+            lemmas_by_lang_level.setdefault(level, []).append(lemma)
+    return lemmas_by_lang_level
+
+
+def write_frequency_tags(lemmas_by_lang_level, tags_directory):
+    """Write the lemmas of each language level to tags_directory/freqNN.txt, except the ignored last level
+    Levels without lemmas have no file, the file of a previous build is removed."""
+    for lang_level, filename in enumerate(FREQUENCY_TAG_FILES, 1):
+        filepath = f"{tags_directory}/{filename}"
+        if not lemmas_by_lang_level.get(lang_level):
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            continue
+        with open(filepath, 'w') as out:
+            out.write('\n'.join(sorted(set(lemmas_by_lang_level[lang_level]))))
+
+
+def build_frequency_tags(tsv_filepath, tags_directory, config, stopwords_filename='stopword.txt', extra_lemmas=None):
+    """Read a words frequency list and write its freqNN.txt tag files
+    Stopwords are read from tags_directory, extra_lemmas maps language levels to word list files
+    of lemmas to add to these levels whatever their ranking."""
+    stopwords = read_stopwords(f'{tags_directory}/{stopwords_filename}')
+    lemmas_by_lang_level = read_frequency_list(tsv_filepath, config, stopwords)
+    for lang_level, filepath in (extra_lemmas or {}).items():
+        lemmas_by_lang_level.setdefault(lang_level, []).extend(read_word_list(filepath))
+    write_frequency_tags(lemmas_by_lang_level, tags_directory)
+    return lemmas_by_lang_level
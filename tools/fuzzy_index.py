@@ -0,0 +1,151 @@
+import itertools
+import unicodedata
+
+import jiji
+
+"""
+Approximate lookup of the lemmas of jiji dictionaries, for queries with typos or without accents
+It uses symmetric deletes, see https://github.com/wolfgarbe/SymSpell: the index maps the strings obtained
+by deleting up to MAX_DISTANCE characters from each lemma to the lemma. The strings obtained the same way
+from a query are looked up, which gives the lemmas close to the query without comparing it to all of them.
+Lemmas and queries are compared without case and accents(etre / être).
+
+The index is built along the dictionary:
+    fuzzy_index = jiji_dict.add_index(FuzzyIndex())
+    fuzzy_index.search('chevax')
+"""
+
+MAX_DISTANCE = 2
+# Only deletes in the first characters of lemmas are indexed, which bounds the size of the index,
+# the end of the lemmas is compared when the candidates are checked
+PREFIX_LENGTH = 7
+# Rank of the entries without freqNN tag
+NO_FREQUENCY_RANK = 99
+
+
+def fold_key(text):
+    """Lowercase text without accents and other combining marks, kana lose their voicing marks(が / か)"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return unicodedata.normalize('NFC', ''.join(c for c in decomposed if not unicodedata.combining(c)))
+
+
+def get_deletes(key, max_distance):
+    """Return key and the strings obtained by deleting up to max_distance of its characters"""
+    deletes = {key}
+    for nb_deleted in range(1, min(max_distance, len(key)) + 1):
+        for positions in itertools.combinations(range(len(key)), nb_deleted):
+            kept = [c for i, c in enumerate(key) if i not in positions]
+            deletes.add(''.join(kept))
+    return deletes
+
+
+def get_matches_by_char(text):
+    """Bit masks of the positions of each character of text"""
+    matches_by_char = {}
+    for i, c in enumerate(text):
+        matches_by_char[c] = matches_by_char.get(c, 0) | 1 << i
+    return matches_by_char
+
+
+def edit_distance(a, b, max_distance, matches_by_char=None):
+    """Damerau-Levenshtein(optimal string alignment) distance between a and b, up to max_distance + 1
+    Bit-parallel algorithm of Hyyrö, A Bit-Vector Algorithm for Computing Levenshtein and Damerau Edit Distances:
+    the differences between consecutive cells of a column of the DP matrix are bits of integers.
+    When a is compared to many strings, get_matches_by_char(a) can be computed once and given."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if not a:
+        return min(len(b), max_distance + 1)
+    if matches_by_char is None:
+        matches_by_char = get_matches_by_char(a)
+    last_bit = 1 << (len(a) - 1)
+    distance = len(a)
+    vertical_positive, vertical_negative, diagonal_zero, previous_matches = -1, 0, 0, 0
+    for c in b:
+        matches = matches_by_char.get(c, 0)
+        transpositions = ((~diagonal_zero & matches) << 1) & previous_matches
+        diagonal_zero = (((matches & vertical_positive) + vertical_positive) ^ vertical_positive) \
+            | matches | vertical_negative | transpositions
+        horizontal_positive = vertical_negative | ~(diagonal_zero | vertical_positive)
+        horizontal_negative = diagonal_zero & vertical_positive
+        if horizontal_positive & last_bit:
+            distance += 1
+        elif horizontal_negative & last_bit:
+            distance -= 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        vertical_positive = (horizontal_negative << 1) | ~(diagonal_zero | horizontal_positive)
+        vertical_negative = diagonal_zero & horizontal_positive
+        previous_matches = matches
+    return min(distance, max_distance + 1)
+
+
+def get_frequency_rank(entry):
+    """Lowest number of the freqNN tags of an entry, the most frequent entries have the lowest rank"""
+    ranks = [number for name, number in map(jiji.split_numbered_tag, entry.tags) if name == 'freq' and number is not None]
+    return min(ranks, default=NO_FREQUENCY_RANK)
+
+
+class FuzzyIndex:
+    """Symmetric deletes index of the lemmas of a dictionary, folded with fold_key"""
+
+    def __init__(self, max_distance=MAX_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.entries_by_key = {}
+        # Folded lemmas by delete, as a single string for most deletes, which are shared by few lemmas
+        self.keys_by_delete = {}
+
+    def add_entry(self, entry):
+        for key in dict.fromkeys(fold_key(l) for l in entry.lemmas):
+            if key in self.entries_by_key:
+                self.entries_by_key[key].append(entry)
+                continue
+            self.entries_by_key[key] = [entry]
+            for delete in get_deletes(key[:self.prefix_length], self.max_distance):
+                keys = self.keys_by_delete.get(delete)
+                if keys is None:
+                    self.keys_by_delete[delete] = key
+                elif isinstance(keys, str):
+                    self.keys_by_delete[delete] = [keys, key]
+                else:
+                    keys.append(key)
+
+    def get_candidates(self, query, max_distance):
+        """Return the folded lemmas sharing a delete with the folded query, they may be further than max_distance"""
+        candidates = set()
+        for delete in get_deletes(query[:self.prefix_length], max_distance):
+            keys = self.keys_by_delete.get(delete)
+            if keys is None:
+                continue
+            if isinstance(keys, str):
+                candidates.add(keys)
+            else:
+                candidates.update(keys)
+        return candidates
+
+    def search(self, query, max_distance=None, limit=10):
+        """Return the (entry, distance) of the limit entries with a lemma closest to query, within max_distance edits,
+        ranked by distance then by frequency(freqNN tags). Case and accents are not counted as edits."""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        query = fold_key(query)
+        results = {}
+        matched_keys = set()
+        matches_by_char = get_matches_by_char(query)
+        # Closer entries always rank first, so the next distance is only searched if there are not enough results
+        for distance in range(max_distance + 1):
+            if len(results) >= limit:
+                break
+            if distance == 0:
+                keys = [query] if query in self.entries_by_key else []
+            else:
+                keys = self.get_candidates(query, distance).difference(matched_keys)
+            for key in keys:
+                if distance and (abs(len(key) - len(query)) > distance
+                                 or edit_distance(query, key, distance, matches_by_char) > distance):
+                    continue
+                matched_keys.add(key)
+                for entry in self.entries_by_key[key]:
+                    if id(entry) not in results:
+                        results[id(entry)] = (entry, distance)
+        ranked = sorted(results.values(), key=lambda result: (result[1], get_frequency_rank(result[0])))
+        return ranked[:limit]
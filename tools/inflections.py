@@ -0,0 +1,134 @@
+import gzip
+import itertools
+from operator import itemgetter
+
+"""
+Inflection tables: the inflected forms of words(conjugated verbs, plural nouns...) and their lemma
+Dictionaries only index lemmas, the table is generated when the dictionary is built so that an inflected form
+is resolved to its lemmas with a single lookup:
+    inflections = InflectionTable.load('jmdict_english.jiji.inflections.tsv.gz')
+    inflections.get_entries(jiji_dict, '食べなかった')
+
+Tables are gzipped text files, with one line per lemma followed by its inflected forms, separated by tabs.
+Japanese forms are generated from the conjugation class of the words, see conjugate,
+other languages forms come from their sources, ex: the inflected rows of Lexique.
+"""
+
+# Rows of the kana of godan verbs endings(a, i, u, e, o) and their te form
+GODAN_ROWS = {'う': 'わいうえお', 'く': 'かきくけこ', 'ぐ': 'がぎぐげご', 'す': 'さしすせそ', 'つ': 'たちつてと',
+              'ぬ': 'なにぬねの', 'ぶ': 'ばびぶべぼ', 'む': 'まみむめも', 'る': 'らりるれろ'}
+GODAN_TE = {'う': 'って', 'く': 'いて', 'ぐ': 'いで', 'す': 'して', 'つ': 'って',
+            'ぬ': 'んで', 'ぶ': 'んで', 'む': 'んで', 'る': 'って'}
+GODAN_CLASSES = {'v5u': 'う', 'v5k': 'く', 'v5g': 'ぐ', 'v5s': 'す', 'v5t': 'つ',
+                 'v5n': 'ぬ', 'v5b': 'ぶ', 'v5m': 'む', 'v5r': 'る'}
+ADJECTIVE_ENDINGS = ['く', 'くない', 'くなかった', 'くなくて', 'くなければ', 'かった', 'かったら', 'くて', 'ければ',
+                     'さ', 'そう', 'すぎる']
+
+
+def verb_endings(negative, masu, te, ta, conditional, potential, volitional, imperative, passive, causative):
+    """Endings of the conjugated forms of a verb, from the endings of its stems"""
+    return [negative + 'ない', negative + 'なかった', negative + 'なくて', negative + 'なければ',
+            masu + 'ます', masu + 'ました', masu + 'ません', masu + 'ませんでした', masu + 'ましょう',
+            masu + 'たい', masu + 'たかった', masu + 'たくない', masu + 'ながら',
+            te, te + 'いる', te + 'いた', te + 'います', te + 'ください', ta, ta + 'ら', ta + 'り',
+            conditional, potential + 'る', potential + 'ない', volitional, imperative, passive, causative]
+
+
+def godan_endings(ending, te=None, masu=None, imperative=None):
+    a, i, u, e, o = GODAN_ROWS[ending]
+    te = te or GODAN_TE[ending]
+    ta = te[:-1] + ('だ' if te.endswith('で') else 'た')
+    return verb_endings(a, masu or i, te, ta, e + 'ば', e, o + 'う', imperative or e, a + 'れる', a + 'せる')
+
+
+ICHIDAN_ENDINGS = verb_endings('', '', 'て', 'た', 'れば', 'られ', 'よう', 'ろ', 'られる', 'させる')
+SURU_ENDINGS = verb_endings('し', 'し', 'して', 'した', 'すれば', 'でき', 'しよう', 'しろ', 'される', 'させる')
+KURU_ENDINGS = verb_endings('こ', 'き', 'きて', 'きた', 'くれば', 'こられ', 'こよう', 'こい', 'こられる', 'こさせる')
+
+# For each conjugation class, the dictionary form endings and the endings replacing them in the conjugated forms,
+# the first ending of the class matching a word is used
+CONJUGATIONS = {
+    'v1': [('る', ICHIDAN_ENDINGS)],
+    **{name: [(ending, godan_endings(ending))] for name, ending in GODAN_CLASSES.items()},
+    'v5k-s': [('く', godan_endings('く', te='って'))],
+    # ある has no negative form of its own, ない is a word on its own
+    'v5r-i': [('る', [e for e in godan_endings('る') if not e.startswith('らな')])],
+    'v5aru': [('る', godan_endings('る', masu='い', imperative='い'))],
+    'vk': [('来る', ['来' + e[1:] for e in KURU_ENDINGS]), ('くる', KURU_ENDINGS)],
+    'vs-i': [('する', SURU_ENDINGS)],
+    'vs': [('', ['する'] + SURU_ENDINGS)],
+    'adj-i': [('い', ADJECTIVE_ENDINGS)],
+    'adj-ix': [('いい', ['よ' + e for e in ADJECTIVE_ENDINGS]), ('い', ADJECTIVE_ENDINGS)],
+}
+
+
+def conjugate(word, conjugation_class):
+    """Return the conjugated forms of a Japanese verb or adjective, conjugation_class is a JMdict
+    part of speech code(v1, v5k, vk, vs, adj-i...), see CONJUGATIONS. Unknown classes have no forms."""
+    for ending, endings in CONJUGATIONS.get(conjugation_class, ()):
+        if word.endswith(ending):
+            stem = word[:len(word) - len(ending)]
+            return list(dict.fromkeys(stem + e for e in endings))
+    return []
+
+
+def write_inflection_table(filename, forms):
+    """Write (inflected form, lemma) pairs to a table file, forms identical to their lemma are skipped.
+    Return the number of forms written."""
+    nb_forms = 0
+    pairs = sorted({(lemma, form) for form, lemma in forms if form and lemma and form != lemma})
+    with gzip.open(filename, 'wt', encoding='utf-8') as out:
+        for lemma, group in itertools.groupby(pairs, key=itemgetter(0)):
+            lemma_forms = [form for _, form in group]
+            out.write(lemma + '\t' + '\t'.join(lemma_forms) + '\n')
+            nb_forms += len(lemma_forms)
+    return nb_forms
+
+
+class InflectionTable:
+    """Lemmas of inflected forms"""
+
+    def __init__(self):
+        # Lemma of each form, or a tuple of lemmas for the few forms that are inflections of several lemmas
+        self.lemmas_by_form = {}
+
+    def __len__(self):
+        return len(self.lemmas_by_form)
+
+    def add_form(self, form, lemma):
+        lemmas = self.lemmas_by_form.get(form)
+        if lemmas is None:
+            self.lemmas_by_form[form] = lemma
+        elif isinstance(lemmas, str):
+            if lemmas != lemma:
+                self.lemmas_by_form[form] = (lemmas, lemma)
+        elif lemma not in lemmas:
+            self.lemmas_by_form[form] = lemmas + (lemma,)
+
+    @classmethod
+    def load(cls, filename):
+        """Read a table written with write_inflection_table"""
+        table = cls()
+        with gzip.open(filename, 'rt', encoding='utf-8') as f:
+            for line in f:
+                lemma, *forms = line.rstrip('\n').split('\t')
+                for form in forms:
+                    table.add_form(form, lemma)
+        return table
+
+    def items(self):
+        """Yield the (form, lemmas) of the table"""
+        for form, lemmas in self.lemmas_by_form.items():
+            yield form, (lemmas,) if isinstance(lemmas, str) else lemmas
+
+    def get_lemmas(self, form):
+        """Return the lemmas form is an inflection of"""
+        lemmas = self.lemmas_by_form.get(form, ())
+        return (lemmas,) if isinstance(lemmas, str) else lemmas
+
+    def get_entries(self, dictionary, form):
+        """Return the entries of dictionary having one of the lemmas of form as lemma or pronunciation"""
+        entries = []
+        for lemma in self.get_lemmas(form):
+            entries += [e for e in dictionary.get_entries_by_key(lemma) if e not in entries]
+        return entries
@@ -0,0 +1,197 @@
+import json
+import mmap
+import struct
+import sys
+
+import jiji
+
+"""
+Compiled lookup index for jiji dictionaries(.jiji.idx files)
+The index is meant for lookup services: it is opened with mmap so it starts instantly,
+does not parse YAML or create Python objects for the whole dictionary, and its pages
+are shared by all the processes reading the same file. Only the records of the entries
+looked up are read, their strings are decoded to new Entry objects at each lookup.
+
+File layout, all integers are little endian:
+- header: magic, version, number of keys, number of entries and the offset of each section
+- records: the packed entries, see pack_entry
+- postings: for each key, the offsets of its entries records(u64)
+- key strings: the UTF-8 encoded lemmas, in sorted order
+- key table: one fixed size row per lemma, sorted by UTF-8 bytes so it can be binary searched
+- about: the _about_this_dictionary information as UTF-8 JSON, up to the end of the file
+"""
+
+MAGIC = b'JIJIIDX\0'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIQQQQQ')
+KEY_ROW = struct.Struct('<QIQI')  # key string offset, key length, first posting offset, number of postings
+POSTING = struct.Struct('<Q')
+RECORD_HEADER = struct.Struct('<IHHHH')  # record length, number of lemmas, senses, pronunciations and tags
+
+USAGE = """Usage:
+    python -m tools.jiji_index dictionary.jiji.yaml dictionary.jiji.idx"""
+
+
+def pack_entry(entry):
+    """Pack an entry as a record: a header with the number of strings in each list,
+    the length of each string, then the UTF-8 strings themselves. An entry without id gets an empty one,
+    entry.id would create a new one."""
+    strings = [str(entry.entry_id) if entry.entry_id else ''] + entry.lemmas + entry.senses + entry.pronunciations + entry.tags
+    encoded = [s.encode() for s in strings]
+    lengths = struct.pack(f'<{len(encoded)}I', *[len(s) for s in encoded])
+    data = lengths + b''.join(encoded)
+    return RECORD_HEADER.pack(RECORD_HEADER.size + len(data), len(entry.lemmas), len(entry.senses),
+                              len(entry.pronunciations), len(entry.tags)) + data
+
+
+def unpack_entry(buffer, offset):
+    """Create an entry from its packed record in buffer"""
+    _, nb_lemmas, nb_senses, nb_pronunciations, nb_tags = RECORD_HEADER.unpack_from(buffer, offset)
+    nb_strings = 1 + nb_lemmas + nb_senses + nb_pronunciations + nb_tags
+    offset += RECORD_HEADER.size
+    lengths = struct.unpack_from(f'<{nb_strings}I', buffer, offset)
+    offset += 4 * nb_strings
+    strings = []
+    for length in lengths:
+        strings.append(str(buffer[offset:offset + length], 'utf-8'))
+        offset += length
+    entry = jiji.Entry(strings[0] or None)
+    idx = 1
+    entry.lemmas = strings[idx:idx + nb_lemmas]
+    idx += nb_lemmas
+    entry.senses = strings[idx:idx + nb_senses]
+    idx += nb_senses
+    entry.pronunciations = strings[idx:idx + nb_pronunciations]
+    idx += nb_pronunciations
+    entry.tags = strings[idx:idx + nb_tags]
+    return entry
+
+
+def compile_index(source, filename):
+    """Compile a jiji Dictionary, or a jiji YAML file, to a lookup index file
+    A YAML file is read one entry at a time so it does not need to fit in memory.
+    Entries without sense are not indexed, like when a dictionary is saved."""
+    if isinstance(source, jiji.Dictionary):
+        about = {'title': source.title, 'licence': source.licence,
+                 'languages': {'from': source.lang_from, 'to': source.lang_to}}
+        entries = (e for e in source.entries if e.senses)
+    else:
+        about = {}
+        entries = read_entries(source, about)
+
+    with open(filename, 'wb') as out:
+        out.write(b'\0' * HEADER.size)
+
+        # Write entries records and remember their offsets by lemma
+        records_offset = out.tell()
+        offsets_by_lemma = {}
+        nb_entries = 0
+        for e in entries:
+            record_offset = out.tell()
+            out.write(pack_entry(e))
+            nb_entries += 1
+            for l in e.lemmas:
+                offsets_by_lemma.setdefault(l.encode(), []).append(record_offset)
+        keys = sorted(offsets_by_lemma)
+
+        postings_offset = out.tell()
+        for k in keys:
+            out.write(b''.join(POSTING.pack(o) for o in offsets_by_lemma[k]))
+
+        strings_offset = out.tell()
+        out.write(b''.join(keys))
+
+        table_offset = out.tell()
+        string_offset = strings_offset
+        posting_offset = postings_offset
+        for k in keys:
+            nb_postings = len(offsets_by_lemma[k])
+            out.write(KEY_ROW.pack(string_offset, len(k), posting_offset, nb_postings))
+            string_offset += len(k)
+            posting_offset += nb_postings * POSTING.size
+
+        # The about information of a YAML file is only known once it has been read
+        about_offset = out.tell()
+        out.write(json.dumps(about).encode())
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, len(keys), nb_entries, records_offset,
+                              postings_offset, strings_offset, table_offset, about_offset))
+
+
+def read_entries(filename, about):
+    """Yield the entries of a jiji YAML file, the about information is stored in the about dict"""
+    for key, value in jiji.iter_dictionary_items(filename):
+        if key == jiji.Dictionary.ABOUT_DICT_KEY:
+            about.update(value)
+            continue
+        try:
+            yield jiji.Entry.from_dict(key, value)
+        except jiji.EntryWithoutSense:
+            continue
+
+
+class DictionaryIndex:
+    """Read only access to a compiled lookup index file"""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.nb_keys, self.nb_entries, _, _, _,
+         self.table_offset, about_offset) = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise RuntimeError(f"{filename} is not a jiji index file(version {VERSION})")
+        about = json.loads(self.buffer[about_offset:])
+        self.title = about.get('title', '')
+        self.licence = about.get('licence', '')
+        languages = about.get('languages') or {}
+        self.lang_from = languages.get('from', '')
+        self.lang_to = languages.get('to') or self.lang_from
+
+    def __len__(self):
+        return self.nb_keys
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.buffer.close()
+
+    def get_key(self, idx):
+        """Return the UTF-8 encoded lemma of the idx-th row of the key table"""
+        string_offset, length, _, _ = KEY_ROW.unpack_from(self.buffer, self.table_offset + idx * KEY_ROW.size)
+        return self.buffer[string_offset:string_offset + length]
+
+    def find_key(self, key):
+        """Binary search the key table for the first row whose lemma is >= key(UTF-8 encoded)"""
+        lo, hi = 0, self.nb_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.get_key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get_entries_offsets(self, idx):
+        """Return the records offsets of the entries of the idx-th row of the key table"""
+        _, _, posting_offset, nb_postings = KEY_ROW.unpack_from(self.buffer, self.table_offset + idx * KEY_ROW.size)
+        return struct.unpack_from(f'<{nb_postings}Q', self.buffer, posting_offset)
+
+    def get_entries_by_lemma(self, lemma):
+        key = lemma.encode()
+        idx = self.find_key(key)
+        if idx == self.nb_keys or self.get_key(idx) != key:
+            return []
+        return [unpack_entry(self.buffer, o) for o in self.get_entries_offsets(idx)]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(USAGE)
+        sys.exit(1)
+    compile_index(sys.argv[1], sys.argv[2])
@@ -0,0 +1,63 @@
+import re
+import unicodedata
+
+"""
+Normalized lookup index over the lemmas and pronunciations of Japanese jiji dictionaries
+Queries are matched whatever their width(ＣＤ / CD, ｶﾞ / ガ), case, kana script(ねこ / ネコ)
+and their spelling of long vowels(らーめん / らあめん), with a single hash lookup per query:
+both the keys of the entries and the queries are reduced to the same form by normalize_key.
+
+The index is built along the dictionary:
+    kana_index = jiji_dict.add_index(KanaIndex())
+    kana_index.get_entries('しーでぃーぷれーやー')
+"""
+
+# Katakana(ァ to ヶ) to the hiragana 0x60 code points below, ヴ becomes ゔ
+KATAKANA_TO_HIRAGANA = {c: c - 0x60 for c in range(ord('ァ'), ord('ヶ') + 1)}
+LONG_VOWEL_MARK = 'ー'
+VOWEL_BY_KANA = {kana: vowel for vowel, kanas in (
+    ('あ', 'あかさたなはまやらわがざだばぱぁゃゎ'),
+    ('い', 'いきしちにひみりぎじぢびぴぃゐ'),
+    ('う', 'うくすつぬふむゆるぐずづぶぷぅゅゔ'),
+    ('え', 'えけせてねへめれげぜでべぺぇゑ'),
+    ('お', 'おこそとのほもよろをごぞどぼぽぉょ'),
+) for kana in kanas}
+LONG_VOWEL_REGEX = re.compile(f"([{''.join(VOWEL_BY_KANA)}])({LONG_VOWEL_MARK}+)")
+
+
+def expand_long_vowel(match):
+    kana, marks = match.groups()
+    return kana + VOWEL_BY_KANA[kana] * len(marks)
+
+
+def normalize_key(text):
+    """Return the form of a lemma, pronunciation or query used as key of the index:
+    NFKC(full width latin and half width kana to their usual width), casefolded,
+    katakana folded to hiragana and long vowel marks replaced by the vowel they lengthen"""
+    text = unicodedata.normalize('NFKC', text).casefold().translate(KATAKANA_TO_HIRAGANA)
+    if LONG_VOWEL_MARK in text:
+        text = LONG_VOWEL_REGEX.sub(expand_long_vowel, text)
+    return text
+
+
+class KanaIndex:
+    """Index of the entries by the normalized form of their lemmas and pronunciations"""
+
+    def __init__(self):
+        self.entries_by_key = {}
+
+    def add_entry(self, entry):
+        # dict.fromkeys so an entry is indexed once under keys with the same normalized form(ネコ / ねこ)
+        for key in dict.fromkeys(normalize_key(k) for k in entry.lemmas + entry.pronunciations):
+            if key in self.entries_by_key:
+                self.entries_by_key[key].append(entry)
+            else:
+                self.entries_by_key[key] = [entry]
+
+    def get_entries(self, query):
+        """Return the entries with a lemma or pronunciation matching query once normalized,
+        the entries where query appears as is come first"""
+        entries = self.entries_by_key.get(normalize_key(query), [])
+        if len(entries) > 1:
+            entries = sorted(entries, key=lambda e: query not in e.lemmas and query not in e.pronunciations)
+        return entries
@@ -1,3 +1,5 @@
+import bisect
+
 """
 We want to categorize the words/lemmas of a language in 12 levels, from the most frequently used to the rarely used.
 An additional level 13 contains words/lemmas with a frequency ranking > 50000 that should be ignored
@@ -13,9 +15,6 @@ LANG_LEVEL_LIMITS = [0,400,1000,1800,2800,4000,5500,7500,10000,14000,20000,30000
 
 
 def get_language_level(word_rank):
-    """Compute the language level of a word according to its frequency ranking"""
-    word_lang_level = 0
-    for idx, limit in enumerate(LANG_LEVEL_LIMITS):
-        if word_rank > limit:
-            word_lang_level = idx + 1
-    return word_lang_level
+    """Compute the language level of a word according to its frequency ranking
+    The level is the number of limits lower than the rank, found by binary search"""
+    return bisect.bisect_left(LANG_LEVEL_LIMITS, word_rank)
@@ -0,0 +1,116 @@
+import re
+import json
+import math
+import heapq
+from array import array
+
+import jiji
+
+"""
+Reverse(target language) full text index over the senses of a jiji dictionary
+It maps the words of the glosses to the entries using them, so that a dictionary
+can be searched from the target language: English -> Japanese, English -> French...
+Results are ranked with BM25, see https://en.wikipedia.org/wiki/Okapi_BM25
+
+The index can be built while the dictionary is built:
+    sense_index = jiji_dict.add_index(SenseIndex())
+then saved along the dictionary and loaded back without re-reading all the senses:
+    sense_index = SenseIndex.load('dictionary.senses.json', jiji_dict)
+"""
+
+WORD_REGEX = re.compile(r'\w+')
+BM25_K1 = 1.2
+BM25_B = 0.75
+FILE_VERSION = 1
+
+
+def tokenize(text):
+    """Split a sense or a query in lowercase words"""
+    return WORD_REGEX.findall(text.lower())
+
+
+def get_gloss(entry, sense):
+    """Return the sense without its (lemma, reading) restriction, which is in the source language. A parenthesis
+    whose content is not only forms of the entry is part of the gloss, like in "(one's) parents"."""
+    restriction, gloss = jiji.split_sense_restriction(sense)
+    if restriction is None or any(r not in entry.lemmas and r not in entry.pronunciations for r in restriction):
+        return sense
+    return gloss
+
+
+class SenseIndex:
+    """Inverted index from the words of the senses to the dictionary entries"""
+
+    def __init__(self):
+        # Indexed entries by document number, with their keys to resolve them when the index is loaded
+        self.entries = []
+        self.keys = []
+        self.doc_lengths = array('I')
+        # For each word, the numbers of the documents containing it interleaved with the word frequency
+        self.postings = {}
+        self.total_length = 0
+
+    def add_entry(self, entry):
+        doc = len(self.entries)
+        self.entries.append(entry)
+        self.keys.append(entry.get_entry_key())
+        frequencies = {}
+        words = [w for sense in entry.senses for w in tokenize(get_gloss(entry, sense))]
+        for w in words:
+            frequencies[w] = frequencies.get(w, 0) + 1
+        for w, frequency in frequencies.items():
+            if w not in self.postings:
+                self.postings[w] = array('I')
+            self.postings[w].extend((doc, frequency))
+        self.doc_lengths.append(len(words))
+        self.total_length += len(words)
+
+    def search(self, query, limit=10):
+        """Return the (entry, score) of the entries best matching the query words, best first"""
+        nb_docs = len(self.entries)
+        if not nb_docs:
+            return []
+        avg_length = self.total_length / nb_docs or 1
+        scores = {}
+        for w in set(tokenize(query)):
+            postings = self.postings.get(w)
+            if not postings:
+                continue
+            nb_matching_docs = len(postings) // 2
+            idf = math.log(1 + (nb_docs - nb_matching_docs + 0.5) / (nb_matching_docs + 0.5))
+            for i in range(0, len(postings), 2):
+                doc, frequency = postings[i], postings[i + 1]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(limit, ((score, -doc) for doc, score in scores.items()
+                                      if self.entries[doc] is not None))
+        return [(self.entries[-neg_doc], score) for score, neg_doc in best]
+
+    def save(self, filename):
+        """Write the index to a JSON file, entries are stored by key"""
+        with open(filename, 'w') as out:
+            json.dump({
+                'version': FILE_VERSION,
+                'keys': self.keys,
+                'doc_lengths': self.doc_lengths.tolist(),
+                'postings': {w: p.tolist() for w, p in self.postings.items()},
+            }, out, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, filename, dictionary):
+        """Read an index saved with save, its entries are resolved by key in dictionary.
+        Like in a saved dictionary, when several entries share a key the last one is used.
+        The index is registered in the dictionary to index the entries added afterwards."""
+        with open(filename) as f:
+            data = json.load(f)
+        if data.get('version') != FILE_VERSION:
+            raise RuntimeError(f"{filename} is not a sense index file(version {FILE_VERSION})")
+        entries_by_key = {e.get_entry_key(): e for e in dictionary.entries}
+        index = cls()
+        index.keys = data['keys']
+        index.entries = [entries_by_key.get(k) for k in index.keys]
+        index.doc_lengths = array('I', data['doc_lengths'])
+        index.total_length = sum(index.doc_lengths)
+        index.postings = {w: array('I', p) for w, p in data['postings'].items()}
+        dictionary.indexes.append(index)
+        return index
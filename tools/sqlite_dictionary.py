@@ -0,0 +1,92 @@
+import sqlite3
+
+import jiji
+
+"""
+Queries on the SQLite export of jiji dictionaries, see Dictionary.save_sqlite
+Entries are read from the database when they are looked up, the dictionary is never loaded in memory:
+    with SqliteDictionary('jmdict_english.jiji.sqlite') as db:
+        db.get_entries_by_lemma('猫')
+        db.get_entries_by_tags(['jlpt3', 'freq02'])
+        db.search_senses('cat')
+"""
+
+# SQLite limits the number of parameters of a query, entries are read by batches of this size
+QUERY_BATCH_SIZE = 500
+
+
+class SqliteDictionary:
+    """Read only access to a dictionary saved with Dictionary.save_sqlite"""
+
+    def __init__(self, filename):
+        self.db = sqlite3.connect(f'file:{filename}?mode=ro', uri=True)
+        self.title, self.licence, self.lang_from, self.lang_to = self.db.execute(
+            'SELECT title, licence, lang_from, lang_to FROM about').fetchone()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def get_entries(self, ids):
+        """Create the entries with the given database ids, in the same order"""
+        entries = {}
+        ids = list(ids)
+        for start in range(0, len(ids), QUERY_BATCH_SIZE):
+            batch = ids[start:start + QUERY_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            for i, entry_id in self.db.execute(f'SELECT id, entry_id FROM entries WHERE id IN ({placeholders})', batch):
+                entries[i] = jiji.Entry(entry_id)
+            for table, column in (('lemmas', 'lemma'), ('pronunciations', 'pronunciation'),
+                                  ('senses', 'sense'), ('tags', 'tag')):
+                query = f'SELECT entry, {column} FROM {table} WHERE entry IN ({placeholders}) ORDER BY entry, position'
+                for i, value in self.db.execute(query, batch):
+                    getattr(entries[i], table).append(value)
+        return [entries[i] for i in ids if i in entries]
+
+    def get_ids(self, table, column, value):
+        return [i for i, in self.db.execute(f'SELECT DISTINCT entry FROM {table} WHERE {column} = ? ORDER BY entry', (value,))]
+
+    def get_entries_by_lemma(self, lemma):
+        return self.get_entries(self.get_ids('lemmas', 'lemma', lemma))
+
+    def get_entries_by_pronunciation(self, pronunciation):
+        return self.get_entries(self.get_ids('pronunciations', 'pronunciation', pronunciation))
+
+    def get_entries_by_key(self, key):
+        """Entries with key as lemma, then entries with key as pronunciation, like Dictionary.get_entries_by_key
+        Entries whose lemma is also their pronunciation(ex: kana only words) are only returned once."""
+        ids = self.get_ids('lemmas', 'lemma', key) + self.get_ids('pronunciations', 'pronunciation', key)
+        return self.get_entries(dict.fromkeys(ids))
+
+    def get_entries_by_tags(self, tags, match_all=True, limit=None):
+        """Entries tagged with all the tags(or any of them if match_all is False), in the dictionary order"""
+        tags = list(dict.fromkeys(tags))
+        placeholders = ', '.join('?' * len(tags))
+        query = f'SELECT entry FROM tags WHERE tag IN ({placeholders}) GROUP BY entry'
+        params = tags
+        if match_all:
+            query += ' HAVING COUNT(DISTINCT tag) = ?'
+            params = tags + [len(tags)]
+        query += ' ORDER BY entry'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params = params + [limit]
+        return self.get_entries(i for i, in self.db.execute(query, params))
+
+    def search_senses(self, query, limit=10):
+        """Return the entries with senses matching a FTS5 query, best first, see https://www.sqlite.org/fts5.html"""
+        try:
+            rows = self.db.execute('SELECT senses.entry FROM senses_fts JOIN senses ON senses.id = senses_fts.rowid '
+                                   'WHERE senses_fts MATCH ? GROUP BY senses.entry ORDER BY MIN(senses_fts.rank) LIMIT ?',
+                                   (query, limit))
+            return self.get_entries(i for i, in rows)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"Cannot search the senses of the dictionary: {e}")
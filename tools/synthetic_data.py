@@ -0,0 +1,135 @@
+import os
+import gzip
+import random
+
+"""
+Seeded generators of synthetic builders inputs, for benchmarks
+The files have the same format as the real sources(JMdict XML, BCCWJ and Lexique TSV, tag files)
+but random content, so that any size can be generated and the same seed gives the same files.
+"""
+
+KANA = 'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん'
+KATAKANA = 'アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲン'
+KANJI = '日本語学生先車電話家猫声人大年中子出見言時行事自者生会手前同地方新'
+FRENCH_LETTERS = 'abcdefghijklmnopqrstuvwxyzéèàç'
+ENGLISH_WORDS = ('thing', 'person', 'to do', 'place', 'time', 'water', 'fire', 'word', 'house', 'cat', 'dog',
+                 'to eat', 'to go', 'big', 'small', 'red', 'book', 'car', 'tree', 'mountain', 'river', 'sky')
+JMDICT_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE JMdict [
+<!ELEMENT JMdict (entry*)>
+<!ENTITY n "noun (common) (futsuumeishi)">
+<!ENTITY v5r "Godan verb with `ru' ending">
+<!ENTITY adj-i "adjective (keiyoushi)">
+<!ENTITY uk "word usually written using kana alone">
+]>
+<JMdict>
+'''
+POS_ENTITIES = ('&n;', '&v5r;', '&adj-i;')
+
+
+def number_to_word(number, alphabet, min_length=1):
+    """Write a number in base len(alphabet), so that each number gives a different word"""
+    letters = []
+    while number or len(letters) < min_length:
+        number, idx = divmod(number, len(alphabet))
+        letters.append(alphabet[idx])
+    return ''.join(letters)
+
+
+def generate_japanese_lemmas(nb_lemmas, seed=0):
+    """Return a list of distinct kana and kanji lemmas in random order"""
+    rng = random.Random(seed)
+    lemmas = [number_to_word(i, KANJI if i % 3 == 0 else KANA, 2) for i in range(nb_lemmas)]
+    rng.shuffle(lemmas)
+    return lemmas
+
+
+def generate_french_lemmas(nb_lemmas, seed=0):
+    rng = random.Random(seed)
+    lemmas = [number_to_word(i, FRENCH_LETTERS, 3) for i in range(nb_lemmas)]
+    rng.shuffle(lemmas)
+    return lemmas
+
+
+def generate_jmdict(filepath, nb_entries, seed=0):
+    """Write a gzipped JMdict-like XML file, see builders/japanese/english-jmdict/process_jmdict.py"""
+    rng = random.Random(seed)
+    with gzip.open(filepath, 'wt', encoding='utf-8') as out:
+        out.write(JMDICT_HEADER)
+        for i in range(nb_entries):
+            xml = [f'<entry>\n<ent_seq>{1000000 + i}</ent_seq>\n']
+            kanjis = [number_to_word(i * 2 + k, KANJI, 2) for k in range(rng.choice((0, 1, 1, 2)))]
+            readings = [number_to_word(i * 3 + r, KANA if r < 2 else KATAKANA, 3) for r in range(rng.choice((1, 1, 2, 3)))]
+            for k in kanjis:
+                pri = f'<ke_pri>nf{rng.randint(1, 48):02}</ke_pri>\n' if rng.random() < 0.3 else ''
+                xml.append(f'<k_ele>\n<keb>{k}</keb>\n{pri}</k_ele>\n')
+            for r in readings:
+                restr = f'<re_restr>{kanjis[0]}</re_restr>\n' if kanjis and rng.random() < 0.1 else ''
+                pri = f'<re_pri>nf{rng.randint(1, 48):02}</re_pri>\n' if rng.random() < 0.2 else ''
+                xml.append(f'<r_ele>\n<reb>{r}</reb>\n{restr}{pri}</r_ele>\n')
+            for _ in range(rng.choice((1, 1, 2, 3))):
+                glosses = ''.join(f'<gloss>{rng.choice(ENGLISH_WORDS)} {rng.choice(ENGLISH_WORDS)}</gloss>\n'
+                                  for _ in range(rng.randint(1, 3)))
+                stagr = f'<stagr>{readings[0]}</stagr>\n' if len(readings) > 1 and rng.random() < 0.05 else ''
+                misc = '<misc>&uk;</misc>\n' if rng.random() < 0.2 else ''
+                xml.append(f'<sense>\n{stagr}<pos>{rng.choice(POS_ENTITIES)}</pos>\n{misc}{glosses}</sense>\n')
+            xml.append('</entry>\n')
+            out.write(''.join(xml))
+        out.write('</JMdict>\n')
+
+
+def generate_tag_files(directory, lemmas, seed=0, missing_ratio=0.2):
+    """Write tag files like builders/japanese/tags: stopword, jlpt1-5 and freq01-12
+    A part of the lemmas in the files are not in the lemmas list, like in the real files."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    tag_files = ['stopword.txt'] + [f'jlpt{i}.txt' for i in range(1, 6)] + [f'freq{i:02}.txt' for i in range(1, 13)]
+    nb_tagged = len(lemmas) // 3
+    for name in tag_files:
+        nb_lines = max(1, nb_tagged // len(tag_files))
+        lines = [rng.choice(lemmas) if rng.random() > missing_ratio else f'missing{rng.randint(0, 10 ** 9)}'
+                 for _ in range(nb_lines)]
+        with open(os.path.join(directory, name), 'w') as out:
+            out.write('\n'.join(lines))
+    return tag_files
+
+
+def generate_bccwj(filepath, nb_rows, seed=0):
+    """Write a BCCWJ-like frequency TSV file, see builders/japanese/wordsfrequency/process_bccwj.py"""
+    rng = random.Random(seed)
+    lemmas = generate_japanese_lemmas(nb_rows, seed)
+    with open(filepath, 'w', encoding='utf-8') as out:
+        out.write('\t'.join(f'col{c}' for c in range(40)) + '\n')
+        for rank, lemma in enumerate(lemmas, 1):
+            row = [''] * 40
+            row[0] = str(rank)
+            row[2] = lemma if rng.random() > 0.001 else lemma + '■'
+            # Columns are (rank, frequency) pairs for each register, empty when the lemma does not appear in it
+            for col in (11, 32, 35):
+                if rng.random() > 0.1:
+                    row[col] = str(max(1, rank + rng.randint(-rank // 2, rank // 2)))
+                    row[col + 1] = str(rng.randint(1, 1000))
+            out.write('\t'.join(row) + '\n')
+    return lemmas
+
+
+def generate_lexique(filepath, nb_rows, seed=0):
+    """Write a Lexique-like frequency TSV file, see builders/french/wordsfrequency/process_lexique.py"""
+    rng = random.Random(seed)
+    lemmas = generate_french_lemmas(nb_rows, seed)
+    with open(filepath, 'w', encoding='utf-8') as out:
+        out.write('\t'.join(f'{c}_col' for c in range(1, 36)) + '\n')
+        for lemma in lemmas:
+            row = [''] * 35
+            row[0] = row[2] = lemma
+            row[6] = f'{rng.expovariate(0.05):.2f}' if rng.random() > 0.1 else ''
+            row[7] = f'{rng.expovariate(0.05):.2f}' if rng.random() > 0.1 else ''
+            row[13] = '1' if rng.random() > 0.3 else '0'
+            out.write('\t'.join(row) + '\n')
+    return lemmas
+
+
+def write_word_list(filepath, words):
+    """Write a list of words, one per line, like the stopwords or frequent expressions files"""
+    with open(filepath, 'w') as out:
+        out.write('\n'.join(words))
@@ -0,0 +1,123 @@
+import sys
+
+import jiji
+
+"""
+Annotation of whole documents with the entries of a jiji dictionary, for reading assistants
+The lemmas of the dictionary, and all their prefixes, are the keys of a single dict: it is a trie whose nodes
+are found by hashing the text walked so far. A document is scanned in one pass, the trie is walked from each
+position for as long as the text is a prefix of some lemma. Each step hashes the slice of text walked so far,
+so the cost is O(n·L²) for a text of length n and lemmas prefixes matched up to length L, whatever the number
+of lemmas. L is small in practice(a few characters for most positions), and a single dict takes much less
+memory than a dict of children per node. An Aho-Corasick automaton(trie with failure links) scans in O(n) but
+runs Python code for each character and each match, it was 2 to 3 times slower on Japanese texts.
+
+    annotator = TextAnnotator(jiji_dict)
+    for start, end, entries, levels in annotator.annotate('猫が好きです'):
+        ...
+    with open('article.txt') as f:
+        for span in annotator.annotate_stream(iter(lambda: f.read(65536), '')):
+            ...
+"""
+
+USAGE = """Usage:
+    python -m tools.text_annotation dictionary.jiji.yaml article.txt"""
+
+# Tags giving the difficulty of a word, returned with the matching spans
+LEVEL_TAGS = ('freq', 'jlpt')
+
+
+def get_level_tags(entries):
+    """Return the freqNN / jlptN tags of entries, without duplicates"""
+    tags = (t for e in entries for t in e.tags if jiji.split_numbered_tag(t)[0] in LEVEL_TAGS)
+    return tuple(dict.fromkeys(tags))
+
+
+def is_word(text, start, end):
+    """Whether text[start:end] is not part of a longer word"""
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+class TextAnnotator:
+    """Longest match(or all matches) of the lemmas of a dictionary in texts"""
+
+    def __init__(self, dictionary, word_boundaries=False, inflections=None):
+        """Build the trie of the lemmas of dictionary, the entries should not change afterwards.
+        With word_boundaries, only spans that are whole words are matched, for languages written with spaces.
+        The inflected forms of an InflectionTable(see tools/inflections.py) are matched to the entries of their lemmas."""
+        self.word_boundaries = word_boundaries
+        # Lemmas map to their (entries, level tags), prefixes that are not lemmas to None
+        self.nodes = {}
+        self.max_length = 0
+        for lemma, entries in dictionary.entries_by_lemma.items():
+            self.add_node(lemma, entries)
+        if inflections is not None:
+            for form, _ in inflections.items():
+                entries = inflections.get_entries(dictionary, form)
+                if entries and not self.nodes.get(form):
+                    self.add_node(form, entries)
+
+    def add_node(self, key, entries):
+        self.nodes[key] = (entries, get_level_tags(entries))
+        for length in range(len(key) - 1, 0, -1):
+            if key[:length] in self.nodes:
+                break
+            self.nodes[key[:length]] = None
+        self.max_length = max(self.max_length, len(key))
+
+    def scan(self, text, position, stop, longest, offset):
+        """Yield the spans starting between position and stop in text, offset is the position of text in the document.
+        From each position, a new slice of text is hashed for each character of the longest matching prefix.
+        Return the position where the next scan should start."""
+        nodes = self.nodes
+        while position < stop:
+            matches = []
+            end = position + 1
+            while end <= len(text):
+                node = nodes.get(text[position:end], False)
+                if node is False:
+                    break
+                if node is not None and (not self.word_boundaries or is_word(text, position, end)):
+                    matches.append((end, node))
+                end += 1
+            if longest and matches:
+                end, (entries, levels) = matches[-1]
+                yield offset + position, offset + end, entries, levels
+                position = end
+                continue
+            for end, (entries, levels) in matches:
+                yield offset + position, offset + end, entries, levels
+            position += 1
+        return position
+
+    def annotate(self, text, longest=True):
+        """Yield the (start, end, entries, level tags) of the spans of text matching a lemma, in order.
+        With longest, the longest lemma starting at the leftmost position is matched and the scan continues
+        after it, otherwise all the matching spans are yielded, including overlapping ones."""
+        return self.scan(text, 0, len(text), longest, 0)
+
+    def annotate_stream(self, chunks, longest=True):
+        """Like annotate, for a document given as an iterable of text chunks, with positions in the whole document.
+        Only the chunk being scanned and the end of the previous one are kept in memory."""
+        buffer, offset, position = '', 0, 0
+        for chunk in chunks:
+            buffer += chunk
+            # A lemma starting before stop, and the character after it, are in the buffer
+            stop = len(buffer) - self.max_length
+            if stop > position:
+                position = yield from self.scan(buffer, position, stop, longest, offset)
+                # Keep one character before the next position to check word boundaries
+                drop = max(position - 1, 0)
+                buffer, offset, position = buffer[drop:], offset + drop, position - drop
+        yield from self.scan(buffer, position, len(buffer), longest, offset)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(USAGE)
+        sys.exit(1)
+    jiji_dict = jiji.Dictionary.load(sys.argv[1])
+    annotator = TextAnnotator(jiji_dict, word_boundaries=jiji_dict.lang_from.lower() != 'japanese')
+    with open(sys.argv[2]) as f:
+        for start, end, entries, levels in annotator.annotate_stream(iter(lambda: f.read(65536), '')):
+            print(start, end, entries[0].lemmas[0], ' '.join(levels))